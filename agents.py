@@ -20,17 +20,55 @@ https://www.youtube.com/watch?v=IpTFe0H52JM
 """
 
 import utils
+import bitboard
 import random
+import time
+import parallel
+import tablebase
+from evaluation import IncrementalEval, table_score
+from gamestate import GameState
+from transposition import TranspositionTable
+from zobrist import zobrist_table
+
+# deepest iteration a timed search will try
+MAX_DEPTH = 64
+# how many nodes between two clock checks in a timed search
+TIME_CHECK_NODES = 256
+# width of a zero window search, heuristic scores are multiples of 0.5 so nothing fits in between
+# (and alpha + 0.25 stays exact in floating point)
+PVS_WINDOW = 0.25
+# half width of the root window around the previous iteration's score
+ASPIRATION_WINDOW = 20
+
+
+class SearchTimeout(Exception):
+    """
+    raised inside the search when the deadline of a timed find_best_move has passed
+    """
+    pass
+
 
 class MiniMaxAgent:
-    def __init__(self, player):
+    """
+    The search engine every model is made of, the model names of main.py are presets of these features (PRESETS):
+    pruning: alpha beta instead of plain minimax
+    repetition: threefold repetition is a draw, the game and search history is hashed
+    evaluation: 'v1' naive heuristic (runs of two), 'v2' threats and patterns
+    tt: give the agent a transposition table
+    ordering: killer moves and history heuristic (bitboard and make/unmake searches)
+    rules / bb / start_board pick the grid: utils, bitboard and the 5x4 board here, large.py has the 7x6 one
+    """
+    rules = utils
+    bb = bitboard
+    start_board = [
+        [0, None, None, None, 1],
+        [1, None, None, None, 0],
+        [0, None, None, None, 1],
+        [1, None, None, None, 0],
+    ]
+
+    def __init__(self, player, pruning=False, repetition=False, evaluation='v1', tt=False, ordering=False):
         self.player = player # 0/white/max or 1/black/min
-        self.board = [
-            [0, None, None, None, 1],
-            [1, None, None, None, 0],
-            [0, None, None, None, 1],
-            [1, None, None, None, 0],
-        ]
         # TODO: may change it so that it tracks a list of pieces... these are wrong tho (should do -1)
         # if player == 0:
         #     self.my_pieces = [(1,1),(1,3),(5,2),(5,4)] # X Y
@@ -39,47 +77,124 @@ class MiniMaxAgent:
         #     self.op_pieces = [(1,1),(1,3),(5,2),(5,4)] # X Y
         #     self.my_pieces =  [(1,2),(1,4),(5,1),(5,3)] # X Y
         self.dirs = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}
+        height, width = len(self.start_board), len(self.start_board[0])
+        self.zobrist_table = zobrist_table(width, height)
+        # board, hash and repetition history of the game (gamestate.py), the game loop shares it
+        self.state = GameState(self.rules, self.start_board, self.zobrist_table)
+        # what the search does, see the class docstring
+        self.pruning = pruning
+        self.repetition = repetition
+        self.evaluation = evaluation
+        # transposition table (transposition.py), None = no table
+        self.tt = TranspositionTable() if tt else None
+        # move ordering (killer moves per ply + history heuristic), used by the bitboard and make/unmake searches
+        self.ordering = ordering
+        # search on bitboards (self.bb, bitboard.py's 5x4 functions or bitboard.LARGE) instead of the list board
+        self.use_bitboard = False
+        # search on one list board with make/unmake instead of copying it for every child
+        self.make_unmake = False
+        self.undo_stack = []
+        # keep the heuristic as running sums updated on make/unmake (evaluation.py), make/unmake search only
+        self.incremental = False
+        self.eval_state = None
+        # heuristic from the line code tables of evaluation.py instead of scanning the board
+        self.table_eval = False
+        # heuristic v2 of every 5x4 position read from a file (evaltable.py)
+        self.eval_table = None
+        # batcheval.BatchEval: the list search scores all children of a depth 1 node in one numpy call
+        self.batch_eval = None
+        # set by timed searches (find_best_move(time_limit=...)), checked every TIME_CHECK_NODES nodes
+        self.deadline = None
+        # timecontrol.TimeManager of a server game, decides when a timed search stops deepening
+        self.clock = None
+        # (depth, seconds) of the last iteration a timed search finished, how deep a pondered answer has to be
+        self.completed = None
+        self.nodes = 0
+        # principal variation search + aspiration windows (alpha beta agents only), used by the bitboard and
+        # make/unmake searches
+        self.pvs = False
+        self.root_depth = 0
+        self.killers = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self.history_scores = [0] * (height * width * 4)
+        self.move_index = self.rules.move_index
+        self.ordering_stats = {}
+        # searches shared out between this many worker processes (parallel.py), 1 = serial search.
+        # parallel: 'split' shares out the root moves, 'smp' runs helpers on the same root (lazy smp)
+        self.workers = 1
+        self.parallel = 'split'
+        self.splitter = None
+        self.smp = None
+        # stop flag of a lazy smp helper, checked with the clock
+        self.stop = None
+        # endgame tablebase (tablebase.py), probed at the root and in the nodes of the bitboard and make/unmake searches
+        self.tablebase = None
+        # opening book (book.py), looked up before searching
+        self.book = None
+        # key the transposition table on the canonical image of the position (mirrors share one entry)
+        self.symmetry = False
+        self.symmetry_tables = None
+        self.symmetry_bb = None
+        # move that led to the node the list search enters next and its hash (without self.repetition, to key the
+        # table), set just before the call (minimax keeps the legacy signatures), None at the root
+        self.last_move = None
+        self.last_hash = None
 
     def heuristic(self, state, status):
         """
-        calculates naive heuristic (runs of two) 
+        score of state for self.player, +-inf once the game is over, self.evaluation picks the heuristic
         """
         if status == self.player:
             return float('inf')
         elif status == (1 - self.player):
             return float('-inf')
+        if self.eval_table is not None and self.evaluation == 'v2':
+            white, black = bitboard.from_board(state)
+            if self.player == 0:
+                return self.eval_table.value(white, black)
+            return self.eval_table.value(black, white)
+        if self.table_eval:
+            return table_score(self.rules, state, self.player, self.evaluation)
+        if self.evaluation == 'v2':
+            return self.heuristic_v2(state)
+        return self.heuristic_v1(state)
+
+    def heuristic_v1(self, state):
+        """
+        calculates naive heuristic (runs of two) 
+        """
         curr_player = self.player
         opp_player = 1 - self.player
+        height, width = len(state), len(state[0])
         my_score = 0
         opp_score = 0
 
         # Check horizontal
-        for y in range(4):
-            for x in range(4):
+        for y in range(height):
+            for x in range(width - 1):
                 if state[y][x] == curr_player and state[y][x+1] == curr_player:
                     my_score += 1
                 elif state[y][x] == opp_player and state[y][x+1] == opp_player:
                     opp_score += 1 
 
         # Check vertical
-        for y in range(3):
-            for x in range(5):
+        for y in range(height - 1):
+            for x in range(width):
                 if state[y][x] == curr_player and state[y+1][x] == curr_player:
                     my_score += 1
                 elif state[y][x] == opp_player and state[y+1][x] == opp_player:
                     opp_score += 1
 
         # Check diagonal (down-right)
-        for y in range(3):
-            for x in range(4):
+        for y in range(height - 1):
+            for x in range(width - 1):
                 if state[y][x] == curr_player and state[y+1][x+1] == curr_player:
                     my_score += 1
                 elif state[y][x] == opp_player and state[y+1][x+1] == opp_player:
                     opp_score += 1
 
         # Check diagonal (down-left)
-        for y in range(3):
-            for x in range(1, 5):
+        for y in range(height - 1):
+            for x in range(1, width):
                 if state[y][x] == curr_player and state[y+1][x-1] == curr_player:
                     my_score += 1
                 elif state[y][x] == opp_player and state[y+1][x-1] == opp_player:
@@ -87,7 +202,48 @@ class MiniMaxAgent:
         
         return my_score - opp_score
 
+    def heuristic_v2(self, state):
+        """
+        Changed Heuristic, so that it is not naive.
+        Inspired from Victor Aliss Connect 4 work. (winning / threat pattern recognition, positional value, Zugzwang )
+        And some of my own intuition.
 
+        calculates heuristic v2
+        winning setups + 100
+        forcing setups * 10
+        winning patterns * 4
+        runs of two * 1
+        pos/grouping score * 2
+        """
+        rules = self.rules
+        def_factor = 1.5
+        curr_player = self.player
+        opp_player = 1 - self.player
+        
+        my_patterns, my_threats = rules.count_forcing_threats(state, curr_player)
+        opp_patterns, opp_threats = rules.count_forcing_threats(state, opp_player)
+
+        my_double = 100 if my_threats > 1 else 0
+        opp_double = 100 if opp_threats > 1 else 0
+
+
+        double_score = my_double - opp_double * def_factor
+        
+        threat_score = 10 * (my_threats - opp_threats * def_factor)
+        pattern_score = 4 * (my_patterns - opp_patterns * def_factor)
+
+        my_runsoftwo = rules.count_runsoftwo(state, curr_player)
+        opp_runsoftwo = rules.count_runsoftwo(state, opp_player)
+
+        runsoftwo_score = 1 * (my_runsoftwo - opp_runsoftwo * def_factor)
+
+        my_pos = rules.pos_score(state, curr_player)
+        opp_pos = rules.pos_score(state, opp_player)
+
+        pos_score = 2 *  (my_pos - opp_pos * def_factor)
+
+        
+        return double_score + threat_score + pattern_score + runsoftwo_score + pos_score
 
     def gen_actions(self, state, is_max):
         """
@@ -103,587 +259,918 @@ class MiniMaxAgent:
 
         moves = []
         player = 0 if is_max else 1
-        for y in range(4):
-            for x in range(5):
-                if state[y][x] == player:
-                    for dx, dy in self.dirs.values():
-                        new_x, new_y = x + dx, y + dy
-                        if utils.in_board(new_x, new_y) and state[new_y][new_x] is None:
-                            moves.append(((x, y), (new_x, new_y)))
+        move_tuples = self.rules.MOVE_TUPLES
+        destinations = self.rules.DESTINATIONS
+        for y, row in enumerate(state):
+            for x, piece in enumerate(row):
+                if piece == player:
+                    for code, new_x, new_y in destinations[y][x]:
+                        if state[new_y][new_x] is None:
+                            moves.append(move_tuples[code])
         return moves
 
-
-    def minimax(self, state, depth, is_max):
-
-        status = utils.game_status(state)
-        #terminal state or depth cutoff
-        if status is not None or depth == 0:
-            return self.heuristic(state, status), None
-        
-        moves = self.gen_actions(state, is_max)
-
-        if is_max:
-            max_eval = float('-inf')
-            best_move = None
-            for move in moves:
-                eval, _ = self.minimax(utils.make_move(state, move, True), depth-1, False)        
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-            return max_eval, best_move
-        else:
-            min_eval = float('inf')
-            best_move = None
-            for move in moves:
-                eval, _= self.minimax(utils.make_move(state, move, False), depth-1, True)
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-            return min_eval, best_move
-
-    def find_best_move(self, depth):
+    def gen_move_codes(self, state, is_max):
         """
-        logic to find best action
+        gen_actions as move codes (rules.move_index), same order
         """
-        is_max = True if self.player == 0 else False
-
-        score, best_move = self.minimax(self.board, depth, is_max,)
-
-        print(f"Agent {self.player} found best move: {best_move} with score: {score}")
-
-        if best_move is None:
-            print("Agent sees terminal state or no moves")
-            return None
-
-        # Update Board
-        self.board = utils.make_move(self.board, best_move, is_max)
+        moves = []
+        player = 0 if is_max else 1
+        destinations = self.rules.DESTINATIONS
+        for y, row in enumerate(state):
+            for x, piece in enumerate(row):
+                if piece == player:
+                    for code, new_x, new_y in destinations[y][x]:
+                        if state[new_y][new_x] is None:
+                            moves.append(code)
+        return moves
 
-        return utils.format_move_to_string(best_move)
-    
-    def update_board_opp(self, input):
+    # LIST SEARCH -----------------------------------------------------------------------------------------------------
+    def list_args(self, curr_hash, history, alpha, beta):
         """
-        update board with received values
-        input shaped as 14E
+        what minimax takes after (state, depth, is_max), it depends on the flags like the old agents' signatures did:
+        (curr_hash, history) with self.repetition, then (alpha, beta) with self.pruning
         """
-        is_max = True if self.player == 0 else False
-        opponent_is = not is_max
-
-        x = int(input[0])-1
-        y = int(input[1])-1
-        dir = input[2].upper()
-
-        new_x, new_y = x, y
-        if dir == 'N':
-            new_y -= 1
-        elif dir == 'S':
-            new_y += 1
-        elif dir == 'E':
-            new_x += 1
-        elif dir == 'W':
-            new_x -= 1
-
-        move = ((x, y), (new_x, new_y))
+        args = (curr_hash, history) if self.repetition else ()
+        if self.pruning:
+            args += (alpha, beta)
+        return args
 
+    def list_tt_key(self, state, curr_hash):
+        """
+        tt_key for the list board searches
+        """
+        if self.symmetry:
+            return self.rules.canonical_hash(state, self.symmetry_tables)
+        return curr_hash, 0
 
-        self.board = utils.make_move(self.board, move, opponent_is)
-        print(f"opponent moved: {input}")
-
-class MiniMaxAgentD(MiniMaxAgent):
-    def __init__(self, player):
-        super().__init__(player)
-        self.board_history = {}
-        self.zobrist_table = [[[random.getrandbits(64) for _ in range(5)] for _ in range(4)] for _ in range(2)]
-
-    def minimax(self, state, depth, is_max, curr_hash, history):
-
-        status = utils.game_status(state)
+    def minimax(self, state, depth, is_max, *args):
+        """
+        The plain search on list boards, every child is a copy of the board. args: see list_args
+        """
+        last_hash, self.last_hash = self.last_hash, None
+        curr_hash, history = args[:2] if self.repetition else (last_hash, None)
+        alpha, beta = args[-2:] if self.pruning else (float('-inf'), float('inf'))
+        rules = self.rules
+        last_move, self.last_move = self.last_move, None
+        self.check_time()
+        status = rules.game_status(state) if last_move is None else rules.game_status_after(state, last_move)
         #terminal state or depth cutoff
         if status is not None or depth == 0:
             return self.heuristic(state, status), None
-        
-        moves = self.gen_actions(state, is_max)
 
-        if is_max:
-            max_eval = float('-inf')
-            best_move = None
-            for move in moves:
-                new_hash = utils.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
-                new_history = history.copy()
-                new_history[new_hash] = new_history.get(new_hash, 0) + 1
-
-                if new_history[new_hash] >= 3:
+        tt = self.tt
+        tt_move = None
+        if tt is not None:
+            if curr_hash is None:
+                curr_hash = rules.calculate_initial_hash(state, self.zobrist_table)
+            alpha_orig, beta_orig = alpha, beta
+            tt_key, sym = self.list_tt_key(state, curr_hash)
+            tt_score, tt_move, alpha, beta = tt.probe(tt_key, depth, alpha, beta)
+            tt_move = rules.transform_move(tt_move, sym)
+            if tt_score is not None:
+                return tt_score, tt_move
+
+        moves = self.move_first(self.gen_actions(state, is_max), tt_move)
+        best_eval = float('-inf') if is_max else float('inf')
+        best_move = None
+        # the children are leaves: score them all at once instead of searching them one by one
+        leaves = None
+        if depth == 1 and self.batch_eval is not None and moves:
+            leaves = self.batch_eval.scores(self.batch_eval.children(state, moves), self.player, self.evaluation)
+            self.nodes += len(moves)
+        for i, move in enumerate(moves):
+            if self.repetition:
+                new_hash = rules.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
+                if rules.enter_position(history, new_hash) >= 3:
                     eval = 0
+                elif leaves is not None:
+                    eval = leaves[i]
                 else:
-                    eval, _ = self.minimax(utils.make_move(state, move, True), depth-1, False, new_hash, new_history)
-                
-                if eval > max_eval:
-                    max_eval = eval
+                    self.last_move = move
+                    eval, _ = self.minimax(rules.make_move(state, move, is_max), depth-1, not is_max,
+                                           *self.list_args(new_hash, history, alpha, beta))
+                rules.leave_position(history, new_hash)
+            elif leaves is not None:
+                eval = leaves[i]
+            else:
+                self.last_move = move
+                if tt is not None:
+                    self.last_hash = rules.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
+                eval, _ = self.minimax(rules.make_move(state, move, is_max), depth-1, not is_max,
+                                       *self.list_args(0, None, alpha, beta))
+
+            if is_max:
+                if eval > best_eval:
+                    best_eval = eval
                     best_move = move
-            return max_eval, best_move
-        else:
-            min_eval = float('inf')
-            best_move = None
-            for move in moves:
-
-                new_hash = utils.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
-                new_history = history.copy()
-                new_history[new_hash] = new_history.get(new_hash, 0) + 1
-
-                if new_history[new_hash] >= 3:
-                    eval = 0
-                else:
-                    eval, _= self.minimax(utils.make_move(state, move, False), depth-1, True, new_hash, new_history)
-                
-                if eval < min_eval:
-                    min_eval = eval
+                alpha = max(alpha, best_eval)
+            else:
+                if eval < best_eval:
+                    best_eval = eval
                     best_move = move
-            return min_eval, best_move
+                beta = min(beta, best_eval)
+            if self.pruning and beta <= alpha:
+                break
+
+        if tt is not None:
+            tt.save(tt_key, depth, best_eval, alpha_orig, beta_orig, rules.transform_move(best_move, sym))
+        return best_eval, best_move
 
-    def find_best_move(self, depth):
+    def find_best_move(self, depth=None, time_limit=None):
         """
         logic to find best action
+        depth: fixed search depth, or the deepest iteration when time_limit is given
+        time_limit: seconds, deepens 1, 2, 3, ... and returns the move of the last finished iteration
         """
+        if self.use_bitboard:
+            return self.find_best_move_bb(depth, time_limit)
+        if self.use_make_unmake(time_limit):
+            return self.find_best_move_mu(depth, time_limit)
         is_max = True if self.player == 0 else False
 
-        init_history = self.board_history.copy()
-        init_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-        init_history[init_hash] = init_history.get(init_hash, 0) + 1
+        init_hash = 0
+        init_history = None
+        if self.repetition:
+            init_history = self.state.history.copy()
+            init_hash = self.state.hash
+        self.setup_symmetry()
 
-
-        score, best_move = self.minimax(self.board, depth, is_max, init_hash, init_history)
+        self.nodes = 0
+        score, best_move = self.minimax(self.board, depth, is_max,
+                                        *self.list_args(init_hash, init_history, float('-inf'), float('inf')))
 
         print(f"Agent {self.player} found best move: {best_move} with score: {score}")
 
         if best_move is None:
             print("Agent sees terminal state or no moves")
-            return None
-
-        # Update Board
-        self.board = utils.make_move(self.board, best_move, is_max)
-        # update game history with new board
-        update_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-        self.board_history[update_hash] = self.board_history.get(update_hash, 0) + 1
+            moves = self.gen_actions(self.board, is_max)
+            if self.rules.game_status(self.board) is not None or not moves:
+                return None
+            # every move loses, still better than forfeiting
+            best_move = random.choice(moves)
 
-        return utils.format_move_to_string(best_move)
-
-class AlphaBeta(MiniMaxAgent):
-    def __init__(self, player):
-        super().__init__(player)
+        return self.play_move(best_move)
 
-    def minimax(self, state, depth, is_max, alpha, beta):
+    def use_make_unmake(self, time_limit):
+        """
+        the list search can't be stopped half way, split between workers or use the tablebase and book,
+        make/unmake gives the same results and can
+        """
+        return (self.make_unmake or time_limit is not None or self.workers > 1
+                or self.tablebase is not None or self.book is not None or self.symmetry or self.incremental)
 
-        status = utils.game_status(state)
-        #terminal state or depth cutoff
-        if status is not None or depth == 0:
-            return self.heuristic(state, status), None
-        
-        moves = self.gen_actions(state, is_max)
+    # ITERATIVE DEEPENING ---------------------------------------------------------------------------------------------
+    def check_time(self):
+        """
+        counts a node and stops the search once the deadline has passed
+        """
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_NODES == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop.value:
+                raise SearchTimeout()
+
+    def move_first(self, moves, move):
+        """
+        puts move in front of moves if it is one of them
+        """
+        if move is not None and move in moves:
+            moves.remove(move)
+            moves.insert(0, move)
+        return moves
 
-        if is_max:
-            max_eval = float('-inf')
-            best_move = None
-            for move in moves:
-                eval, _ = self.minimax(utils.make_move(state, move, True), depth-1, False, alpha, beta)        
-                if eval > max_eval:
-                    max_eval = eval
+    def deepen(self, search, depth, time_limit):
+        """
+        Runs search(depth, first_move) once, or with a time_limit deepens 1, 2, 3, ... (up to depth if given)
+        and returns (score, best_move) of the last iteration that finished.
+        Each iteration tries the previous best move first, and the transposition table (if any) keeps the
+        best moves of the rest of the tree.
+        """
+        self.nodes = 0
+        if time_limit is None:
+            return search(depth, None)
+
+        start = time.perf_counter()
+        self.deadline = start + time_limit
+        max_depth = depth if depth is not None else MAX_DEPTH
+        score, best_move = None, None
+        try:
+            for d in range(1, max_depth + 1):
+                if self.pvs and score is not None and abs(score) != float('inf'):
+                    # aspiration window: expect about the same score as last iteration, full window if it isn't
+                    low, high = score - ASPIRATION_WINDOW, score + ASPIRATION_WINDOW
+                    score, move = search(d, best_move, low, high)
+                    if score <= low or score >= high:
+                        score, move = search(d, best_move)
                     best_move = move
-                alpha = max(alpha, max_eval)
-                if beta <= alpha:
+                else:
+                    score, best_move = search(d, best_move)
+                elapsed = time.perf_counter() - start
+                self.completed = d, elapsed
+                print(f"depth {d}: {best_move} score {score} ({self.nodes} nodes, {elapsed:.2f}s)")
+                # won or lost for sure, deeper won't change it
+                if score in (float('inf'), float('-inf')):
                     break
-            return max_eval, best_move
-        else:
-            min_eval = float('inf')
-            best_move = None
-            for move in moves:
-                eval, _= self.minimax(utils.make_move(state, move, False), depth-1, True, alpha, beta)
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                
-                beta = min(beta, min_eval)
-                if beta<= alpha:
+                if self.clock is not None:
+                    if not self.clock.next_iteration(d, best_move, score, elapsed):
+                        break
+                # the next iteration takes a few times longer than this one, don't start what can't finish
+                elif elapsed > time_limit / 2:
                     break
-            return min_eval, best_move
-
-    def find_best_move(self, depth):
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+        return score, best_move
+
+    # PRINCIPAL VARIATION SEARCH --------------------------------------------------------------------------------------
+    def search_child(self, child, first, is_max, alpha, beta):
         """
-        logic to find best action
+        Searches one child with self.pvs, child(alpha, beta) returns its score (without pvs the searches call
+        themselves, no closure per child). Only the first move gets the full window, the others a zero window that
+        only tells if they beat the best move so far; the few that do are searched again with the full window.
         """
-        is_max = True if self.player == 0 else False
-
-        score, best_move = self.minimax(self.board, depth, is_max, float('-inf'), float('inf'))
-
-        print(f"Agent {self.player} found best move: {best_move} with score: {score}")
-
-        if best_move is None:
-            print("Agent sees terminal state or no moves")
-            return None
-
-        # Update Board
-        self.board = utils.make_move(self.board, best_move, is_max)
-
-        return utils.format_move_to_string(best_move)
-
-class AlphaBetaD(MiniMaxAgentD):
-    def __init__(self, player):
-        super().__init__(player)
-
-    def minimax(self, state, depth, is_max, curr_hash, history, alpha, beta):
-
-        status = utils.game_status(state)
-        #terminal state or depth cutoff
-        if status is not None or depth == 0:
-            return self.heuristic(state, status), None
-        
-        moves = self.gen_actions(state, is_max)
-
+        if first or beta - alpha <= PVS_WINDOW:
+            return child(alpha, beta)
+        # no best move to beat yet (window stuck at +-inf), a zero window can't tell anything
+        if (is_max and alpha == float('-inf')) or (not is_max and beta == float('inf')):
+            return child(alpha, beta)
         if is_max:
-            max_eval = float('-inf')
-            best_move = None
-            for move in moves:
-                new_hash = utils.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
-                new_history = history.copy()
-                new_history[new_hash] = new_history.get(new_hash, 0) + 1
-
-                if new_history[new_hash] >= 3:
-                    eval = 0
-                else:
-                    eval, _ = self.minimax(utils.make_move(state, move, True), depth-1, False, new_hash, new_history, alpha, beta)
-                
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                alpha = max(alpha, max_eval)
-                if beta <= alpha:
-                    break
-            return max_eval, best_move
+            eval = child(alpha, alpha + PVS_WINDOW)
         else:
-            min_eval = float('inf')
-            best_move = None
-            for move in moves:
+            eval = child(beta - PVS_WINDOW, beta)
+        if alpha < eval < beta:
+            eval = child(alpha, beta)
+        return eval
 
-                new_hash = utils.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
-                new_history = history.copy()
-                new_history[new_hash] = new_history.get(new_hash, 0) + 1
-
-                if new_history[new_hash] >= 3:
-                    eval = 0
-                else:
-                    eval, _= self.minimax(utils.make_move(state, move, False), depth-1, True, new_hash, new_history, alpha, beta)
-                
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                beta = min(beta, min_eval)
-            return min_eval, best_move
-
-    def find_best_move(self, depth):
+    # MOVE ORDERING ---------------------------------------------------------------------------------------------------
+    def new_search(self):
         """
-        logic to find best action
+        forgets the killers of the last position and halves the history scores so old moves fade out
         """
-        is_max = True if self.player == 0 else False
-
-        init_history = self.board_history.copy()
-        init_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-        init_history[init_hash] = init_history.get(init_hash, 0) + 1
-
-
-        score, best_move = self.minimax(self.board, depth, is_max, init_hash, init_history, float('-inf'), float('inf'))
-
-        print(f"Agent {self.player} found best move: {best_move} with score: {score}")
+        self.killers = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self.history_scores = [score // 2 for score in self.history_scores]
+        self.ordering_stats = {'cutoffs': 0, 'first': 0, 'tt_pv': 0, 'killer': 0, 'history': 0}
 
-        if best_move is None:
-            print("Agent sees terminal state or no moves")
-            best_move = self.gen_actions(self.board, is_max)
-            best_move = random.choice(best_move)
-            # return None
-
-        # Update Board
-        self.board = utils.make_move(self.board, best_move, is_max)
-        # update game history with new board
-        update_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-        self.board_history[update_hash] = self.board_history.get(update_hash, 0) + 1
-
-        return utils.format_move_to_string(best_move)
-
-class MiniMaxAgentV2(MiniMaxAgent):
-    """
-    Changed Heuristic, so that it is not naive.
-    Inspired from Victor Aliss Connect 4 work. (winning / threat pattern recognition, positional value, Zugzwang )
-    And some of my own intuition.
-    """
-    def __init__(self, player):
-        super().__init__(player)
+    def order_moves(self, moves, ply, lead):
+        """
+        tt/pv move first, then the killer moves of this ply, then the rest by history score
+        """
+        history_scores = self.history_scores
+        move_index = self.move_index
+        if move_index is None:
+            moves.sort(key=history_scores.__getitem__, reverse=True)
+        else:
+            moves.sort(key=lambda m: history_scores[move_index(m)], reverse=True)
+        for killer in reversed(self.killers[ply]):
+            self.move_first(moves, killer)
+        return self.move_first(moves, lead)
 
-    def heuristic(self, state, status):
+    def record_cutoff(self, move, index, lead, ply, depth):
         """
-        calculates heuristic v2
-        winning setups + 100
-        forcing setups * 10
-        winning patterns * 4
-        runs of two * 1
-        pos/grouping score * 2
+        move caused a beta cutoff: keep it as a killer for this ply, raise its history score and count
+        which part of the ordering it came from
+        """
+        stats = self.ordering_stats
+        killers = self.killers[ply]
+        stats['cutoffs'] += 1
+        if index == 0:
+            stats['first'] += 1
+        if move == lead:
+            stats['tt_pv'] += 1
+        elif move in killers:
+            stats['killer'] += 1
+        else:
+            stats['history'] += 1
+
+        if move != lead and move != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history_scores[move if self.move_index is None else self.move_index(move)] += depth * depth
+
+    def print_ordering_stats(self):
+        stats = self.ordering_stats
+        if not stats or not stats['cutoffs']:
+            return
+        print(f"Ordering: {stats['cutoffs']} cutoffs, {stats['first'] / stats['cutoffs']:.0%} on the first move "
+              f"(tt/pv {stats['tt_pv']}, killer {stats['killer']}, history {stats['history']})")
+
+    # BITBOARD SEARCH -------------------------------------------------------------------------------------------------
+    def evaluate_bb(self, mine, theirs):
         """
+        heuristic on bitboards, same value as self.heuristic
+        """
+        if self.evaluation == 'v2':
+            if self.eval_table is not None:
+                return self.eval_table.value(mine, theirs)
+            return self.bb.evaluate_v2(mine, theirs)
+        return self.bb.evaluate_v1(mine, theirs)
+
+    def heuristic_bb(self, white, black, status):
         if status == self.player:
             return float('inf')
         elif status == (1 - self.player):
             return float('-inf')
-        def_factor = 1.5
-        curr_player = self.player
-        opp_player = 1 - self.player
-        
-        my_patterns, my_threats = utils.count_forcing_threats(state, curr_player)
-        opp_patterns, opp_threats = utils.count_forcing_threats(state, opp_player)
-
-        my_double = 100 if my_threats > 1 else 0
-        opp_double = 100 if opp_threats > 1 else 0
+        if self.player == 0:
+            return self.evaluate_bb(white, black)
+        return self.evaluate_bb(black, white)
 
+    def minimax_bb(self, white, black, depth, is_max, alpha, beta, curr_hash, history, first_move=None,
+                   last_move=None):
+        """
+        One search for every agent on bitboards, self.pruning turns on alpha beta,
+        self.repetition the threefold repetition check (history is shared, incremented and decremented on the way)
+        and self.tt the transposition table. last_move: the move that led here, only its lines are checked for a win
+        """
+        self.check_time()
+        if last_move is None:
+            status = self.bb.game_status(white, black)
+        else:
+            status = self.bb.game_status_after(white, black, last_move, not is_max)
+        if status is None and self.tablebase is not None:
+            tb_score = self.tablebase_score(white, black, is_max)
+            if tb_score is not None:
+                return tb_score, None
+        #terminal state or depth cutoff
+        if status is not None or depth == 0:
+            return self.heuristic_bb(white, black, status), None
 
-        double_score = my_double - opp_double * def_factor
-        
-        threat_score = 10 * (my_threats - opp_threats * def_factor)
-        pattern_score = 4 * (my_patterns - opp_patterns * def_factor)
-
-        my_runsoftwo = utils.count_runsoftwo(state, curr_player)
-        opp_runsoftwo = utils.count_runsoftwo(state, opp_player)
-
-        runsoftwo_score = 1 * (my_runsoftwo - opp_runsoftwo * def_factor)
-
-        my_pos = utils.pos_score(state, curr_player)
-        opp_pos = utils.pos_score(state, opp_player)
+        tt_move = None
+        if self.tt is not None:
+            alpha_orig, beta_orig = alpha, beta
+            tt_key, sym = self.tt_key(white, black, curr_hash)
+            tt_score, tt_move, alpha, beta = self.tt.probe(tt_key, depth, alpha, beta)
+            tt_move = self.bb.transform_move(tt_move, sym)
+            if tt_score is not None:
+                return tt_score, tt_move
 
-        pos_score = 2 *  (my_pos - opp_pos * def_factor)
+        player = 0 if is_max else 1
+        if is_max:
+            moves = self.bb.gen_moves(white, black)
+            best_eval = float('-inf')
+        else:
+            moves = self.bb.gen_moves(black, white)
+            best_eval = float('inf')
+        best_move = None
+        # best move of the previous iteration (root) or from the table goes first
+        lead = first_move or tt_move
+        if self.ordering:
+            moves = self.order_moves(moves, self.root_depth - depth, lead)
+        else:
+            moves = self.move_first(moves, lead)
+
+        for i, move in enumerate(moves):
+            if is_max:
+                new_white, new_black = self.bb.make_move(white, move), black
+            else:
+                new_white, new_black = white, self.bb.make_move(black, move)
+            new_hash = curr_hash
+            if self.hashing:
+                new_hash ^= self.zobrist_bb[player][move[0]] ^ self.zobrist_bb[player][move[1]]
+
+            if self.repetition and utils.enter_position(history, new_hash) >= 3:
+                eval = 0
+            elif not self.pvs:
+                eval = self.minimax_bb(new_white, new_black, depth-1, not is_max, alpha, beta, new_hash, history,
+                                       None, move)[0]
+            else:
+                eval = self.search_child(
+                    lambda a, b: self.minimax_bb(new_white, new_black, depth-1, not is_max, a, b, new_hash, history,
+                                                 None, move)[0],
+                    i == 0, is_max, alpha, beta)
+            if self.repetition:
+                utils.leave_position(history, new_hash)
+
+            if is_max:
+                if eval > best_eval:
+                    best_eval = eval
+                    best_move = move
+                if self.pruning:
+                    alpha = max(alpha, best_eval)
+            else:
+                if eval < best_eval:
+                    best_eval = eval
+                    best_move = move
+                if self.pruning:
+                    beta = min(beta, best_eval)
+            if self.pruning and beta <= alpha:
+                if self.ordering:
+                    self.record_cutoff(move, i, lead, self.root_depth - depth, depth)
+                break
+
+        if self.tt is not None:
+            self.tt.save(tt_key, depth, best_eval, alpha_orig, beta_orig, self.bb.transform_move(best_move, sym))
+        return best_eval, best_move
+
+    def tt_key(self, white, black, curr_hash):
+        """
+        (key, sym) of a node in the table: the zobrist hash, or with self.symmetry the canonical image's hash
+        and the symmetry to map the table's moves with
+        """
+        if self.symmetry:
+            return self.bb.canonical_hash(white, black, self.symmetry_bb)
+        return curr_hash, 0
 
-        
-        return double_score + threat_score + pattern_score + runsoftwo_score + pos_score
-    
-    def find_best_move(self, depth):
+    def setup_symmetry(self):
         """
-        logic to find best action
+        tables for canonical_hash, made once per agent (the zobrist table doesn't change)
+        """
+        if not self.symmetry or self.tt is None:
+            return
+        if self.symmetry_tables is None:
+            self.symmetry_tables = self.rules.symmetry_tables(self.zobrist_table)
+        if self.use_bitboard and self.symmetry_bb is None:
+            self.symmetry_bb = self.bb.symmetry_tables(self.bb.flat_zobrist(self.zobrist_table))
+
+    def setup_bb(self):
+        """
+        root of a bitboard search: returns (white, black, hash, repetition history)
         """
+        white, black = self.bb.from_board(self.board)
+
+        init_hash = 0
+        init_history = None
+        self.hashing = self.repetition or self.tt is not None
+        if self.hashing:
+            self.zobrist_bb = self.bb.flat_zobrist(self.zobrist_table)
+            init_hash = self.state.hash
+        if self.repetition:
+            init_history = self.state.history.copy()
+
+        self.setup_symmetry()
+        self.move_index = self.bb.move_index
+        self.new_search()
+        return white, black, init_hash, init_history
+
+    def find_best_move_bb(self, depth, time_limit=None):
+        """
+        find_best_move on bitboards, the list board is only converted once at the root
+        """
+        known_move = self.tablebase_move() or self.book_move()
+        if known_move is not None:
+            return self.play_move(known_move)
         is_max = True if self.player == 0 else False
+        white, black, init_hash, init_history = self.setup_bb()
 
-        score, best_move = self.minimax(self.board, depth, is_max,)
+        def search(d, first_move, alpha=float('-inf'), beta=float('inf')):
+            self.root_depth = d
+            return self.minimax_bb(white, black, d, is_max, alpha, beta, init_hash, init_history, first_move)
+        score, best_move = self.run_search(search, depth, time_limit)
+        self.print_ordering_stats()
 
         print(f"Agent {self.player} found best move: {best_move} with score: {score}")
 
         if best_move is None:
             print("Agent sees terminal state or no moves")
-            return None
+            moves = self.bb.gen_moves(white, black) if is_max else self.bb.gen_moves(black, white)
+            if self.bb.game_status(white, black) is not None or not moves:
+                return None
+            # every move loses, still better than forfeiting
+            best_move = random.choice(moves)
 
-        # Update Board
-        self.board = utils.make_move(self.board, best_move, is_max)
-
-        return utils.format_move_to_string(best_move)
+        return self.play_move(self.bb.to_move_tuple(best_move))
     
-
-class AlphaBetaV2(AlphaBeta):
-    def __init__(self, player):
-        super().__init__(player)
-
-    def heuristic(self, state, status):
+    # MAKE/UNMAKE SEARCH --------------------------------------------------------------------------------------------
+    def make(self, state, code, curr_hash):
         """
-        calculates heuristic v2
-        winning setups + 100
-        forcing setups * 10
-        winning patterns * 4
-        runs of two * 1
-        pos/grouping score * 2
+        plays the move with code (rules.move_index) on state in place and pushes it on the undo stack,
+        returns the new hash
         """
-        if status == self.player:
-            return float('inf')
-        elif status == (1 - self.player):
-            return float('-inf')
-        def_factor = 1.5
-        curr_player = self.player
-        opp_player = 1 - self.player
-        
-        my_patterns, my_threats = utils.count_forcing_threats(state, curr_player)
-        opp_patterns, opp_threats = utils.count_forcing_threats(state, opp_player)
-
-        my_double = 100 if my_threats > 1 else 0
-        opp_double = 100 if opp_threats > 1 else 0
-
-
-        double_score = my_double - opp_double * def_factor
-        
-        threat_score = 10 * (my_threats - opp_threats * def_factor)
-        pattern_score = 4 * (my_patterns - opp_patterns * def_factor)
-
-        my_runsoftwo = utils.count_runsoftwo(state, curr_player)
-        opp_runsoftwo = utils.count_runsoftwo(state, opp_player)
-
-        runsoftwo_score = 1 * (my_runsoftwo - opp_runsoftwo * def_factor)
-
-        my_pos = utils.pos_score(state, curr_player)
-        opp_pos = utils.pos_score(state, opp_player)
-
-        pos_score = 2 *  (my_pos - opp_pos * def_factor)
+        self.undo_stack.append(code)
+        move = self.rules.MOVE_TUPLES[code]
+        curr_hash = self.rules.apply_move(state, move, curr_hash, self.zobrist_table if self.hashing else None)
+        if self.eval_state is not None:
+            self.eval_state.play(state, move)
+        return curr_hash
+
+    def unmake(self, state, curr_hash):
+        """
+        takes back the last move made, returns the hash from before it
+        """
+        move = self.rules.MOVE_TUPLES[self.undo_stack.pop()]
+        if self.eval_state is not None:
+            self.eval_state.undo()
+        return self.rules.undo_move(state, move, curr_hash, self.zobrist_table if self.hashing else None)
 
-        
-        return double_score + threat_score + pattern_score + runsoftwo_score + pos_score
-    
-    def find_best_move(self, depth):
+    def minimax_mu(self, state, depth, is_max, alpha, beta, curr_hash, history, first_move=None, last_move=None):
         """
-        logic to find best action
+        Same search as minimax_bb but on a single list board: every child is made on state and
+        unmade before the next one, so no board is copied. Uses self.heuristic (the running sums of self.eval_state
+        with self.incremental), same results as minimax.
+        Moves inside are codes (rules.move_index), first_move and the returned move are tuples, last_move a code.
         """
+        rules = self.rules
+        move_tuples = rules.MOVE_TUPLES
+        self.check_time()
+        if last_move is None:
+            status = rules.game_status(state)
+        else:
+            status = rules.game_status_after(state, move_tuples[last_move])
+        if status is None and self.tablebase is not None:
+            tb_score = self.tablebase_score(*bitboard.from_board(state), is_max)
+            if tb_score is not None:
+                return tb_score, None
+        #terminal state or depth cutoff
+        if status is not None or depth == 0:
+            if status is None and self.eval_state is not None:
+                return self.eval_state.score(self.player, self.evaluation), None
+            return self.heuristic(state, status), None
 
+        tt_move = None
+        if self.tt is not None:
+            alpha_orig, beta_orig = alpha, beta
+            tt_key, sym = self.list_tt_key(state, curr_hash)
+            tt_score, tt_move, alpha, beta = self.tt.probe(tt_key, depth, alpha, beta)
+            tt_move = rules.transform_move(tt_move, sym)
+            if tt_score is not None:
+                return tt_score, tt_move
+
+        moves = self.gen_move_codes(state, is_max)
+        best_eval = float('-inf') if is_max else float('inf')
+        best_move = None
+        # best move of the previous iteration (root) or from the table goes first
+        lead = first_move or tt_move
+        lead = rules.move_index(lead) if lead is not None else None
+        if self.ordering:
+            moves = self.order_moves(moves, self.root_depth - depth, lead)
+        else:
+            moves = self.move_first(moves, lead)
+
+        for i, move in enumerate(moves):
+            new_hash = self.make(state, move, curr_hash)
+            if self.repetition and rules.enter_position(history, new_hash) >= 3:
+                eval = 0
+            elif not self.pvs:
+                eval = self.minimax_mu(state, depth-1, not is_max, alpha, beta, new_hash, history, None, move)[0]
+            else:
+                eval = self.search_child(
+                    lambda a, b: self.minimax_mu(state, depth-1, not is_max, a, b, new_hash, history, None, move)[0],
+                    i == 0, is_max, alpha, beta)
+            if self.repetition:
+                rules.leave_position(history, new_hash)
+            self.unmake(state, new_hash)
+
+            if is_max:
+                if eval > best_eval:
+                    best_eval = eval
+                    best_move = move
+                if self.pruning:
+                    alpha = max(alpha, best_eval)
+            else:
+                if eval < best_eval:
+                    best_eval = eval
+                    best_move = move
+                if self.pruning:
+                    beta = min(beta, best_eval)
+            if self.pruning and beta <= alpha:
+                if self.ordering:
+                    self.record_cutoff(move, i, lead, self.root_depth - depth, depth)
+                break
+
+        if best_move is not None:
+            best_move = move_tuples[best_move]
+        if self.tt is not None:
+            self.tt.save(tt_key, depth, best_eval, alpha_orig, beta_orig, rules.transform_move(best_move, sym))
+        return best_eval, best_move
+
+    def setup_mu(self):
+        """
+        root of a make/unmake search: returns (board copy, hash, repetition history)
+        """
+        state = [row[:] for row in self.board]
+        self.undo_stack = []
+        self.eval_state = IncrementalEval(self.rules, state, self.evaluation) if self.incremental else None
+
+        init_hash = 0
+        init_history = None
+        self.hashing = self.repetition or self.tt is not None
+        if self.hashing:
+            init_hash = self.state.hash
+        if self.repetition:
+            init_history = self.state.history.copy()
+
+        self.setup_symmetry()
+        # the search's moves are codes, their own history index
+        self.move_index = None
+        self.new_search()
+        return state, init_hash, init_history
+
+    def find_best_move_mu(self, depth, time_limit=None):
+        """
+        find_best_move with make/unmake, the board is copied once at the root and nowhere else
+        """
+        known_move = self.tablebase_move() or self.book_move()
+        if known_move is not None:
+            return self.play_move(known_move)
         is_max = True if self.player == 0 else False
+        state, init_hash, init_history = self.setup_mu()
 
-        score, best_move = self.minimax(self.board, depth, is_max, float('-inf'), float('inf'))
+        def search(d, first_move, alpha=float('-inf'), beta=float('inf')):
+            self.root_depth = d
+            # a stopped search leaves its moves on the board, start every iteration from the root again
+            while self.undo_stack:
+                self.unmake(state, 0)
+            return self.minimax_mu(state, d, is_max, alpha, beta, init_hash, init_history, first_move)
+        score, best_move = self.run_search(search, depth, time_limit)
+        self.print_ordering_stats()
 
         print(f"Agent {self.player} found best move: {best_move} with score: {score}")
 
         if best_move is None:
             print("Agent sees terminal state or no moves")
-            return None
-
-        # Update Board
-        self.board = utils.make_move(self.board, best_move, is_max)
+            moves = self.gen_actions(state, is_max)
+            if self.rules.game_status(state) is not None or not moves:
+                return None
+            # every move loses, still better than forfeiting
+            best_move = random.choice(moves)
 
-        return utils.format_move_to_string(best_move)
-    
+        return self.play_move(best_move)
 
-class MiniMaxv2D(MiniMaxAgentD):
-    def __init__(self, player):
-        super().__init__(player)
-    
-    def heuristic(self, state, status):
+    def play_move(self, move):
         """
-        calculates heuristic v2
-        winning setups + 100
-        forcing setups * 10
-        winning patterns * 4
-        runs of two * 1
-        pos/grouping score * 2
+        plays our move on the game state (board, hash and repetition history), returns it as sent to the server
         """
-        if status == self.player:
-            return float('inf')
-        elif status == (1 - self.player):
-            return float('-inf')
-        def_factor = 1.5
-        curr_player = self.player
-        opp_player = 1 - self.player
-        
-        my_patterns, my_threats = utils.count_forcing_threats(state, curr_player)
-        opp_patterns, opp_threats = utils.count_forcing_threats(state, opp_player)
-
-        my_double = 100 if my_threats > 1 else 0
-        opp_double = 100 if opp_threats > 1 else 0
+        self.state.apply(move)
+        return self.rules.format_move_to_string(move)
 
+    @property
+    def board(self):
+        return self.state.board
 
-        double_score = my_double - opp_double * def_factor
-        
-        threat_score = 10 * (my_threats - opp_threats * def_factor)
-        pattern_score = 4 * (my_patterns - opp_patterns * def_factor)
+    @board.setter
+    def board(self, board):
+        # a position set up from outside (analysis scripts, book.py), its history starts there
+        self.state.set_board(board)
 
-        my_runsoftwo = utils.count_runsoftwo(state, curr_player)
-        opp_runsoftwo = utils.count_runsoftwo(state, opp_player)
+    # TABLEBASE -------------------------------------------------------------------------------------------------------
+    def tablebase_move(self):
+        """
+        the tablebase's move when our position is won or lost, None for a draw or without a tablebase.
+        The table doesn't know the game: with self.repetition a move onto a position already seen twice is a draw,
+        a win goes around it and a loss that has one is left to the search (which takes the draw)
+        """
+        if self.tablebase is None:
+            return None
+        white, black = bitboard.from_board(self.board)
+        if tablebase.white_to_move(white, black) != (self.player == 0):
+            return None
+        drawn = None
+        if self.repetition:
+            zobrist = bitboard.flat_zobrist(self.zobrist_table)
+            history = self.state.history
+
+            def drawn(child_white, child_black):
+                return history.get(bitboard.calculate_hash(child_white, child_black, zobrist), 0) >= 2
+        move, result, distance = self.tablebase.best_move(white, black, drawn)
+        if move is None:
+            return None
+        print(f"Agent {self.player} tablebase: {'win' if result > 0 else 'loss'} in {distance} plies")
+        return bitboard.to_move_tuple(move)
 
-        runsoftwo_score = 1 * (my_runsoftwo - opp_runsoftwo * def_factor)
+    def book_move(self):
+        """
+        the opening book's move for our position, None if it isn't in the book
+        """
+        if self.book is None:
+            return None
+        entry = self.book.lookup(self.board)
+        if entry is None:
+            return None
+        move, score = entry
+        print(f"Agent {self.player} book move: {move} with score: {score}")
+        return move
 
-        my_pos = utils.pos_score(state, curr_player)
-        opp_pos = utils.pos_score(state, opp_player)
+    def tablebase_score(self, white, black, is_max):
+        """
+        inf / -inf (for self.player) when the tablebase has the position as won or lost, None for a draw
+        """
+        if tablebase.white_to_move(white, black) != is_max:
+            return None
+        entry = self.tablebase.probe(white, black)
+        if entry is None:
+            return None
+        to_move = 0 if is_max else 1
+        winner = to_move if entry[0] > 0 else 1 - to_move
+        return float('inf') if winner == self.player else float('-inf')
 
-        pos_score = 2 *  (my_pos - opp_pos * def_factor)
+    # ROOT SPLIT ------------------------------------------------------------------------------------------------------
+    def root_moves(self):
+        """
+        moves at the root, bitboard moves when searching on bitboards
+        """
+        is_max = self.player == 0
+        if self.use_bitboard:
+            white, black = self.bb.from_board(self.board)
+            return self.bb.gen_moves(white, black) if is_max else self.bb.gen_moves(black, white)
+        return self.gen_actions(self.board, is_max)
 
-        
-        return double_score + threat_score + pattern_score + runsoftwo_score + pos_score
+    def search_root_move(self, move, depth, alpha, beta):
+        """
+        score of one root move searched depth deep with (alpha, beta), runs in the parallel.py workers.
+        None when the deadline passed
+        """
+        is_max = self.player == 0
+        player = self.player
+        self.nodes = 0
+        try:
+            if self.use_bitboard:
+                white, black, curr_hash, history = self.setup_bb()
+                if is_max:
+                    white = self.bb.make_move(white, move)
+                else:
+                    black = self.bb.make_move(black, move)
+                if self.hashing:
+                    curr_hash ^= self.zobrist_bb[player][move[0]] ^ self.zobrist_bb[player][move[1]]
+                if self.repetition and utils.enter_position(history, curr_hash) >= 3:
+                    return 0
+                self.root_depth = depth
+                return self.minimax_bb(white, black, depth-1, not is_max, alpha, beta, curr_hash, history, None, move)[0]
+
+            state, curr_hash, history = self.setup_mu()
+            code = self.rules.move_index(move)
+            curr_hash = self.make(state, code, curr_hash)
+            if self.repetition and self.rules.enter_position(history, curr_hash) >= 3:
+                return 0
+            self.root_depth = depth
+            return self.minimax_mu(state, depth-1, not is_max, alpha, beta, curr_hash, history, None, code)[0]
+        except SearchTimeout:
+            return None
 
+    def run_search(self, search, depth, time_limit):
+        """
+        deepen with the parallel search picked by self.parallel when there is more than one worker.
+        Lazy smp needs the transposition table (ab2, ab2D), the other models split the root instead
+        """
+        if self.workers > 1 and self.parallel == 'smp' and self.tt is not None:
+            if self.smp is None:
+                self.smp = parallel.LazySMP(self.workers)
+            max_depth = depth + 1 if depth is not None else MAX_DEPTH
+            return self.smp.search(self, lambda: self.deepen(search, depth, time_limit), max_depth)
+        return self.deepen(self.root_split(search), depth, time_limit)
+
+    def close(self):
+        """
+        shuts down the worker processes of the parallel searches, at the end of a game
+        """
+        if self.splitter is not None:
+            self.splitter.shutdown()
+            self.splitter = None
+        if self.smp is not None:
+            self.smp.shutdown()
+            self.smp = None
+
+    def tt_identity(self, model):
+        """
+        what the transposition table scores depend on besides the position: grid, model, side, move kind and
+        evaluation. Kept in the header of the saved table (games.py --tt_file), a file is only read by the same agent
+        """
+        parts = [self.rules.__name__, model, f"p{self.player}", 'squares' if self.use_bitboard else 'coords',
+                 self.evaluation]
+        for flag, on in (('incremental', self.incremental), ('table_eval', self.table_eval),
+                         ('eval_table', self.eval_table is not None), ('batch_eval', self.batch_eval is not None)):
+            if on:
+                parts.append(flag)
+        return ' '.join(parts)
+
+    def helper_search(self, offset, max_depth):
+        """
+        Lazy smp helper (parallel.py): deepens from 1 + offset to max_depth on the root and throws the results
+        away, what it leaves in the shared table is what counts. Stops when self.stop is raised, returns the nodes
+        """
+        is_max = self.player == 0
+        self.nodes = 0
+        try:
+            if self.use_bitboard:
+                white, black, init_hash, init_history = self.setup_bb()
+                search = lambda d: self.minimax_bb(white, black, d, is_max, float('-inf'), float('inf'),
+                                                   init_hash, init_history)
+            else:
+                state, init_hash, init_history = self.setup_mu()
+                search = lambda d: self.minimax_mu(state, d, is_max, float('-inf'), float('inf'),
+                                                   init_hash, init_history)
+            for d in range(1 + offset, max_depth + 1):
+                self.root_depth = d
+                search(d)
+        except SearchTimeout:
+            pass
+        return self.nodes
+
+    # PONDERING -------------------------------------------------------------------------------------------------------
+    def ponder_search(self, depth):
+        """
+        (score, best_move) of self.state searched depth deep, without playing the move (ponder.py). best_move is a
+        move tuple. Raises SearchTimeout when self.stop is raised
+        """
+        is_max = self.player == 0
+        self.nodes = 0
+        self.root_depth = depth
+        if self.use_bitboard:
+            white, black, init_hash, init_history = self.setup_bb()
+            score, move = self.minimax_bb(white, black, depth, is_max, float('-inf'), float('inf'),
+                                          init_hash, init_history)
+            return score, self.bb.to_move_tuple(move) if move is not None else None
+        state, init_hash, init_history = self.setup_mu()
+        return self.minimax_mu(state, depth, is_max, float('-inf'), float('inf'), init_hash, init_history)
+
+    def predicted_reply(self):
+        """
+        the opponent's move in self.state our last search expected (the table's best move), None if it isn't there
+        """
+        if self.tt is None:
+            return None
+        self.setup_symmetry()
+        board = self.state.board
+        if self.use_bitboard:
+            white, black = self.bb.from_board(board)
+            key, sym = self.tt_key(white, black, self.state.hash)
+            entry = self.tt.lookup(key)
+            move = self.bb.transform_move(entry[3], sym) if entry is not None else None
+            return self.bb.to_move_tuple(move) if move is not None else None
+        key, sym = self.list_tt_key(board, self.state.hash)
+        entry = self.tt.lookup(key)
+        return self.rules.transform_move(entry[3], sym) if entry is not None else None
+
+    def root_split(self, search):
+        """
+        With self.workers > 1 wraps search so the root moves are shared out between worker processes.
+        Positions with a few moves and shallow iterations keep the serial search
+        """
+        moves = self.root_moves()
+        if self.workers <= 1 or len(moves) < parallel.MIN_PARALLEL_MOVES:
+            return search
+        if self.splitter is None:
+            self.splitter = parallel.RootSplitter(self.workers, self)
+
+        def split(d, first_move, alpha=float('-inf'), beta=float('inf')):
+            if d < parallel.MIN_PARALLEL_DEPTH:
+                return search(d, first_move, alpha, beta)
+            self.root_depth = d
+            score, best_move, nodes = self.splitter.search(self, self.move_first(moves, first_move), d, alpha, beta)
+            self.nodes += nodes
+            if score is None:
+                raise SearchTimeout()
+            return score, best_move
+        return split
 
-class AlphaBetav2D(AlphaBetaD):
-    def __init__(self, player):
-        super().__init__(player)
-    
-    def heuristic(self, state, status):
+    def update_board_opp(self, input):
         """
-        calculates heuristic v2
-        winning setups + 100
-        forcing setups * 10
-        winning patterns * 4
-        runs of two * 1
-        pos/grouping score * 2
+        update board with received values
+        input shaped as 14E
         """
-        if status == self.player:
-            return float('inf')
-        elif status == (1 - self.player):
-            return float('-inf')
-        def_factor = 1.5
-        curr_player = self.player
-        opp_player = 1 - self.player
-        
-        my_patterns, my_threats = utils.count_forcing_threats(state, curr_player)
-        opp_patterns, opp_threats = utils.count_forcing_threats(state, opp_player)
+        move = self.rules.parse_move_string(input)
+        self.state.apply(move)
+        print(f"opponent moved: {input}")
 
-        my_double = 100 if my_threats > 1 else 0
-        opp_double = 100 if opp_threats > 1 else 0
 
+# PRESETS -------------------------------------------------------------------------------------------------------------
+# model name (main.py) -> features of MiniMaxAgent
+PRESETS = {
+    'mm': {},
+    'mmD': {'repetition': True},
+    'mm2': {'evaluation': 'v2'},
+    'mm2D': {'repetition': True, 'evaluation': 'v2'},
+    'ab': {'pruning': True, 'ordering': True},
+    'abD': {'pruning': True, 'ordering': True, 'repetition': True},
+    'ab2': {'pruning': True, 'ordering': True, 'evaluation': 'v2', 'tt': True},
+    'ab2D': {'pruning': True, 'ordering': True, 'repetition': True, 'evaluation': 'v2', 'tt': True},
+}
 
-        double_score = my_double - opp_double * def_factor
-        
-        threat_score = 10 * (my_threats - opp_threats * def_factor)
-        pattern_score = 4 * (my_patterns - opp_patterns * def_factor)
 
-        my_runsoftwo = utils.count_runsoftwo(state, curr_player)
-        opp_runsoftwo = utils.count_runsoftwo(state, opp_player)
+def make_agent(model, player, agent_class=MiniMaxAgent, **features):
+    """
+    agent_class with the features of a preset, features given here override the preset's
+    """
+    if model not in PRESETS:
+        raise ValueError(f"Unknown model '{model}'")
+    return agent_class(player, **{**PRESETS[model], **features})
 
-        runsoftwo_score = 1 * (my_runsoftwo - opp_runsoftwo * def_factor)
 
-        my_pos = utils.pos_score(state, curr_player)
-        opp_pos = utils.pos_score(state, opp_player)
+# the old agent classes, kept as names for their presets
+class MiniMaxAgentD(MiniMaxAgent):
+    def __init__(self, player):
+        super().__init__(player, **PRESETS['mmD'])
 
-        pos_score = 2 *  (my_pos - opp_pos * def_factor)
+class AlphaBeta(MiniMaxAgent):
+    def __init__(self, player):
+        super().__init__(player, **PRESETS['ab'])
 
-        
-        return double_score + threat_score + pattern_score + runsoftwo_score + pos_score
-    
-    def minimax(self, state, depth, is_max, curr_hash, history, alpha, beta):
+class AlphaBetaD(MiniMaxAgent):
+    def __init__(self, player):
+        super().__init__(player, **PRESETS['abD'])
 
-        status = utils.game_status(state)
-        #terminal state or depth cutoff
-        if status is not None or depth == 0:
-            return self.heuristic(state, status), None
-        
-        moves = self.gen_actions(state, is_max)
-        # moves = utils.order_moves(state, moves, is_max, self.player)
+class MiniMaxAgentV2(MiniMaxAgent):
+    def __init__(self, player):
+        super().__init__(player, **PRESETS['mm2'])
 
-        if is_max:
-            max_eval = float('-inf')
-            best_move = None
-            for move in moves:
-                new_hash = utils.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
-                new_history = history.copy()
-                new_history[new_hash] = new_history.get(new_hash, 0) + 1
-
-                if new_history[new_hash] >= 3:
-                    eval = 0
-                else:
-                    eval, _ = self.minimax(utils.make_move(state, move, True), depth-1, False, new_hash, new_history, alpha, beta)
-                
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                alpha = max(alpha, max_eval)
-                if beta <= alpha:
-                    break
-            return max_eval, best_move
-        else:
-            min_eval = float('inf')
-            best_move = None
-            for move in moves:
+class AlphaBetaV2(MiniMaxAgent):
+    def __init__(self, player):
+        super().__init__(player, **PRESETS['ab2'])
 
-                new_hash = utils.calculate_new_hash(state, move, curr_hash, self.zobrist_table)
-                new_history = history.copy()
-                new_history[new_hash] = new_history.get(new_hash, 0) + 1
+class MiniMaxv2D(MiniMaxAgent):
+    def __init__(self, player):
+        super().__init__(player, **PRESETS['mm2D'])
 
-                if new_history[new_hash] >= 3:
-                    eval = 0
-                else:
-                    eval, _= self.minimax(utils.make_move(state, move, False), depth-1, True, new_hash, new_history, alpha, beta)
-                
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                beta = min(beta, min_eval)
-            return min_eval, best_move
-    
+class AlphaBetav2D(MiniMaxAgent):
+    def __init__(self, player):
+        super().__init__(player, **PRESETS['ab2D'])
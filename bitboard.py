@@ -0,0 +1,431 @@
+# bitboard.py
+"""
+Bitboard representation of the board, for any size.
+
+A position is two integers, one per colour (white = player 0, black = player 1).
+Square (x, y) is bit number y * width + x, so bit order is the same as scanning the list
+board row by row, which keeps move order identical to MiniMaxAgent.gen_actions.
+
+Moves are (from_sq, to_sq) tuples of square indices.
+
+Bitboards(width, height, value_map) builds the masks and shift tables of one board size and has every function
+below as a method. STANDARD is the 5x4 board and its functions and constants are also this module's (bitboard.gen_moves,
+bitboard.WIDTH, ...), LARGE is the 7x6 board (large.py).
+"""
+
+STANDARD_VALUE_MAP = [
+    [1, 3, 7, 3, 1],
+    [3, 5, 9, 5, 3],
+    [3, 5, 9, 5, 3],
+    [1, 3, 7, 3, 1],
+]
+
+LARGE_VALUE_MAP = [
+    [1, 2, 3, 4, 3, 2, 1],
+    [2, 4, 6, 8, 6, 4, 2],
+    [3, 6, 9, 12, 9, 6, 3],
+    [3, 6, 9, 12, 9, 6, 3],
+    [2, 4, 6, 8, 6, 4, 2],
+    [1, 2, 3, 4, 3, 2, 1],
+]
+
+# same symmetries as utils.SYMMETRIES (mirror x, mirror y)
+SYMMETRIES = [(False, False), (True, False), (False, True), (True, True)]
+
+
+class Bitboards:
+    def __init__(self, width, height, value_map):
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.SIZE = width * height
+        self.FULL = (1 << self.SIZE) - 1
+        self.VALUE_MAP = value_map
+
+        # first and last column, moves and runs must not wrap around the edges
+        self.COL_0 = sum(1 << (y * width) for y in range(height))
+        self.COL_LAST = self.COL_0 << (width - 1)
+
+        # start squares of 3 in a row windows (the shift does the rest)
+        self.H3 = sum(1 << (y * width + x) for y in range(height) for x in range(width - 2))
+        self.DR3 = self.H3
+        self.DL3 = sum(1 << (y * width + x) for y in range(height) for x in range(2, width))
+
+        self.WINDOWS = self._build_windows()
+        # the windows through each square
+        self.WINDOWS_THROUGH = [[w for w in self.WINDOWS if w >> sq & 1] for sq in range(self.SIZE)]
+        self.ADJACENT = self._build_adjacent()
+        self.VALUE_MASKS = self._build_value_masks()
+
+        # symmetries as square maps
+        self.SYMMETRY_SQUARES = [
+            [(height - 1 - sq // width if mirror_y else sq // width) * width
+             + (width - 1 - sq % width if mirror_x else sq % width)
+             for sq in range(self.SIZE)]
+            for mirror_x, mirror_y in SYMMETRIES
+        ]
+        # a bitboard is hashed in chunks of two rows (10 bits on 5x4, 14 on 7x6), one lookup table per chunk
+        self.CHUNK = 2 * width
+        self.CHUNK_MASK = (1 << self.CHUNK) - 1
+        self.CHUNKS = range(0, self.SIZE, self.CHUNK)
+        # unrolled for the sizes we play, canonical_hash runs at every node
+        if len(self.CHUNKS) == 2:
+            self.canonical_hash = self._canonical_hash_2
+        elif len(self.CHUNKS) == 3:
+            self.canonical_hash = self._canonical_hash_3
+
+        # index of the (dx, dy) of a move: N, S, E, W, same order as the agents' dirs
+        self.DIR_INDEX = {-width: 0, width: 1, 1: 2, -1: 3}
+
+    def _build_windows(self):
+        """
+        every 3 cell line on the board as a mask (horizontal, vertical, both diagonals)
+        """
+        width, height = self.WIDTH, self.HEIGHT
+        windows = []
+        for y in range(height):
+            for x in range(width - 2):
+                windows.append((1 << (y * width + x)) | (1 << (y * width + x + 1)) | (1 << (y * width + x + 2)))
+        for y in range(height - 2):
+            for x in range(width):
+                windows.append((1 << (y * width + x)) | (1 << ((y + 1) * width + x)) | (1 << ((y + 2) * width + x)))
+        for y in range(height - 2):
+            for x in range(width - 2):
+                windows.append((1 << (y * width + x)) | (1 << ((y + 1) * width + x + 1))
+                               | (1 << ((y + 2) * width + x + 2)))
+        for y in range(height - 2):
+            for x in range(2, width):
+                windows.append((1 << (y * width + x)) | (1 << ((y + 1) * width + x - 1))
+                               | (1 << ((y + 2) * width + x - 2)))
+        return windows
+
+    def _build_adjacent(self):
+        """
+        orthogonal neighbours of every square as a mask
+        """
+        width, height = self.WIDTH, self.HEIGHT
+        adjacent = []
+        for sq in range(self.SIZE):
+            x, y = sq % width, sq // width
+            mask = 0
+            for dx, dy in ((0, -1), (0, 1), (1, 0), (-1, 0)):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    mask |= 1 << (ny * width + nx)
+            adjacent.append(mask)
+        return adjacent
+
+    def _build_value_masks(self):
+        """
+        one mask per value in the value map so pos_score is a few popcounts
+        """
+        masks = []
+        for value in sorted(set(v for row in self.VALUE_MAP for v in row)):
+            mask = 0
+            for y in range(self.HEIGHT):
+                for x in range(self.WIDTH):
+                    if self.VALUE_MAP[y][x] == value:
+                        mask |= 1 << (y * self.WIDTH + x)
+            masks.append((value, mask))
+        return masks
+
+    # CONVERSIONS -----------------------------------------------------------------------------------------------------
+    def from_board(self, board):
+        """
+        list of lists board -> (white, black) bitboards
+        """
+        width = self.WIDTH
+        white = 0
+        black = 0
+        for y in range(self.HEIGHT):
+            for x in range(width):
+                if board[y][x] == 0:
+                    white |= 1 << (y * width + x)
+                elif board[y][x] == 1:
+                    black |= 1 << (y * width + x)
+        return white, black
+
+    def to_board(self, white, black):
+        """
+        (white, black) bitboards -> list of lists board
+        """
+        width = self.WIDTH
+        board = [[None] * width for _ in range(self.HEIGHT)]
+        for sq in range(self.SIZE):
+            if white >> sq & 1:
+                board[sq // width][sq % width] = 0
+            elif black >> sq & 1:
+                board[sq // width][sq % width] = 1
+        return board
+
+    def to_move_tuple(self, move):
+        """
+        (from_sq, to_sq) -> ((x, y), (new_x, new_y)) as used by utils.format_move_to_string
+        """
+        frm, to = move
+        width = self.WIDTH
+        return ((frm % width, frm // width), (to % width, to // width))
+
+    def flat_zobrist(self, zobrist_table):
+        """
+        zobrist_table[player][y][x] -> zobrist[player][sq]
+        """
+        width = self.WIDTH
+        return [[zobrist_table[p][sq // width][sq % width] for sq in range(self.SIZE)] for p in range(2)]
+
+    def calculate_hash(self, white, black, zobrist):
+        """
+        same value as utils.calculate_initial_hash for the equivalent list board
+        """
+        h = 0
+        for player, bits in ((0, white), (1, black)):
+            while bits:
+                low = bits & -bits
+                h ^= zobrist[player][low.bit_length() - 1]
+                bits ^= low
+        return h
+
+    # SYMMETRY --------------------------------------------------------------------------------------------------------
+    def transform_move(self, move, sym):
+        """
+        image of a (from_sq, to_sq) move under symmetry sym, the same call maps it back
+        """
+        if move is None or sym == 0:
+            return move
+        squares = self.SYMMETRY_SQUARES[sym]
+        return (squares[move[0]], squares[move[1]])
+
+    def symmetry_tables(self, zobrist):
+        """
+        for every symmetry and colour, the hash of the image of each possible chunk of a bitboard, so
+        canonical_hash is a few lookups instead of walking the pieces. zobrist is flat_zobrist's table
+        """
+        tables = []
+        for squares in self.SYMMETRY_SQUARES:
+            colours = []
+            for player in range(2):
+                chunks = []
+                for start in self.CHUNKS:
+                    bits_in_chunk = min(self.CHUNK, self.SIZE - start)
+                    values = [0] * (1 << bits_in_chunk)
+                    for bits in range(1, 1 << bits_in_chunk):
+                        low = bits & -bits
+                        values[bits] = values[bits ^ low] ^ zobrist[player][squares[start + low.bit_length() - 1]]
+                    chunks.append(values)
+                colours.append(chunks)
+            tables.append(colours)
+        return tables
+
+    def canonical_hash(self, white, black, tables):
+        """
+        (key, sym): smallest hash of the images of the position (the same numbers as utils.canonical_hash)
+        """
+        mask = self.CHUNK_MASK
+        white_chunks = [white >> start & mask for start in self.CHUNKS]
+        black_chunks = [black >> start & mask for start in self.CHUNKS]
+        best_key, best_sym = None, 0
+        for sym, (white_tables, black_tables) in enumerate(tables):
+            h = 0
+            for table, chunk in zip(white_tables, white_chunks):
+                h ^= table[chunk]
+            for table, chunk in zip(black_tables, black_chunks):
+                h ^= table[chunk]
+            if best_key is None or h < best_key:
+                best_key, best_sym = h, sym
+        return best_key, best_sym
+
+    def _canonical_hash_2(self, white, black, tables):
+        mask, chunk = self.CHUNK_MASK, self.CHUNK
+        w0, w1 = white & mask, white >> chunk
+        b0, b1 = black & mask, black >> chunk
+        best_key, best_sym = None, 0
+        for sym, ((white_0, white_1), (black_0, black_1)) in enumerate(tables):
+            h = white_0[w0] ^ white_1[w1] ^ black_0[b0] ^ black_1[b1]
+            if best_key is None or h < best_key:
+                best_key, best_sym = h, sym
+        return best_key, best_sym
+
+    def _canonical_hash_3(self, white, black, tables):
+        mask, chunk = self.CHUNK_MASK, self.CHUNK
+        w0, w1, w2 = white & mask, white >> chunk & mask, white >> (2 * chunk)
+        b0, b1, b2 = black & mask, black >> chunk & mask, black >> (2 * chunk)
+        best_key, best_sym = None, 0
+        for sym, ((white_0, white_1, white_2), (black_0, black_1, black_2)) in enumerate(tables):
+            h = white_0[w0] ^ white_1[w1] ^ white_2[w2] ^ black_0[b0] ^ black_1[b1] ^ black_2[b2]
+            if best_key is None or h < best_key:
+                best_key, best_sym = h, sym
+        return best_key, best_sym
+
+    # MOVES -----------------------------------------------------------------------------------------------------------
+    def gen_moves(self, own, other):
+        """
+        generates all moves of the side owning `own`.
+        Shifting the empty squares back onto our pieces gives the pieces that can move in each direction,
+        then the pieces are walked in square order and directions in N, S, E, W order (same order as gen_actions)
+        """
+        width = self.WIDTH
+        empty = ~(own | other) & self.FULL
+        can_n = own & (empty << width)
+        can_s = own & (empty >> width)
+        can_e = own & (empty >> 1) & ~self.COL_LAST
+        can_w = own & (empty << 1) & ~self.COL_0
+
+        moves = []
+        bits = can_n | can_s | can_e | can_w
+        while bits:
+            low = bits & -bits
+            sq = low.bit_length() - 1
+            if can_n & low:
+                moves.append((sq, sq - width))
+            if can_s & low:
+                moves.append((sq, sq + width))
+            if can_e & low:
+                moves.append((sq, sq + 1))
+            if can_w & low:
+                moves.append((sq, sq - 1))
+            bits ^= low
+        return moves
+
+    def move_index(self, move):
+        """
+        from_sq * 4 + direction, used to index per move tables (history heuristic)
+        """
+        return move[0] * 4 + self.DIR_INDEX[move[1] - move[0]]
+
+    @staticmethod
+    def make_move(bits, move):
+        """
+        moves a piece of a single colour, returns the new bitboard for that colour
+        """
+        return bits ^ (1 << move[0]) ^ (1 << move[1])
+
+    # CHECK WIN, GAME STATUS ------------------------------------------------------------------------------------------
+    def has_three(self, bits):
+        """
+        True if bits contain three in a row in any direction
+        """
+        width = self.WIDTH
+        return bool(
+            (bits & (bits >> 1) & (bits >> 2) & self.H3)
+            | (bits & (bits >> width) & (bits >> (2 * width)))
+            | (bits & (bits >> (width + 1)) & (bits >> (2 * width + 2)) & self.DR3)
+            | (bits & (bits >> (width - 1)) & (bits >> (2 * width - 2)) & self.DL3)
+        )
+
+    def game_status(self, white, black):
+        if self.has_three(white):
+            return 0
+        elif self.has_three(black):
+            return 1
+        return None
+
+    def game_status_after(self, white, black, move, is_white):
+        """
+        game_status after move (of white if is_white) from a position that wasn't over: only the windows through
+        the square the piece moved to can have become three in a row
+        """
+        bits = white if is_white else black
+        for window in self.WINDOWS_THROUGH[move[1]]:
+            if bits & window == window:
+                return 0 if is_white else 1
+        return None
+
+    # HEURISTIC -------------------------------------------------------------------------------------------------------
+    def count_runsoftwo(self, bits):
+        """
+        same as utils.count_runsoftwo
+        """
+        width = self.WIDTH
+        not_last = ~self.COL_LAST
+        return (
+            (bits & (bits >> 1) & not_last).bit_count()
+            + (bits & (bits >> width)).bit_count()
+            + (bits & (bits >> (width + 1)) & not_last).bit_count()
+            + (bits & (bits >> (width - 1)) & ~self.COL_0).bit_count()
+        )
+
+    def pos_score(self, bits):
+        """
+        same as utils.pos_score
+        """
+        score = 0
+        for value, mask in self.VALUE_MASKS:
+            score += value * (bits & mask).bit_count()
+        return score
+
+    def count_forcing_threats(self, own, other):
+        """
+        same as utils.count_forcing_threats: a window with two of our pieces and an empty square is a winning
+        pattern, or a forcing threat if another one of our pieces sits next to the empty square
+        """
+        adjacent = self.ADJACENT
+        winning_patterns = 0
+        forcing_threats = 0
+        for mask in self.WINDOWS:
+            mine = own & mask
+            if other & mask or mine.bit_count() != 2:
+                continue
+            gap = mask ^ mine
+            if adjacent[gap.bit_length() - 1] & own & ~mask:
+                forcing_threats += 1
+            else:
+                winning_patterns += 1
+        return winning_patterns, forcing_threats
+
+    def evaluate_v1(self, mine, theirs):
+        """
+        naive heuristic (runs of two), same value as MiniMaxAgent.heuristic
+        """
+        return self.count_runsoftwo(mine) - self.count_runsoftwo(theirs)
+
+    def evaluate_v2(self, mine, theirs):
+        """
+        heuristic v2, same value as MiniMaxAgentV2.heuristic
+        """
+        def_factor = 1.5
+
+        my_patterns, my_threats = self.count_forcing_threats(mine, theirs)
+        opp_patterns, opp_threats = self.count_forcing_threats(theirs, mine)
+
+        my_double = 100 if my_threats > 1 else 0
+        opp_double = 100 if opp_threats > 1 else 0
+
+        double_score = my_double - opp_double * def_factor
+        threat_score = 10 * (my_threats - opp_threats * def_factor)
+        pattern_score = 4 * (my_patterns - opp_patterns * def_factor)
+        runsoftwo_score = 1 * (self.count_runsoftwo(mine) - self.count_runsoftwo(theirs) * def_factor)
+        pos = 2 * (self.pos_score(mine) - self.pos_score(theirs) * def_factor)
+
+        return double_score + threat_score + pattern_score + runsoftwo_score + pos
+
+
+STANDARD = Bitboards(5, 4, STANDARD_VALUE_MAP)
+LARGE = Bitboards(7, 6, LARGE_VALUE_MAP)
+
+# the 5x4 board as module level names (tablebase.py, evaltable.py, book.py and the agents use them directly)
+WIDTH, HEIGHT, SIZE, FULL = STANDARD.WIDTH, STANDARD.HEIGHT, STANDARD.SIZE, STANDARD.FULL
+COL_0, COL_4 = STANDARD.COL_0, STANDARD.COL_LAST
+H3, DR3, DL3 = STANDARD.H3, STANDARD.DR3, STANDARD.DL3
+VALUE_MAP = STANDARD.VALUE_MAP
+WINDOWS, WINDOWS_THROUGH = STANDARD.WINDOWS, STANDARD.WINDOWS_THROUGH
+ADJACENT, VALUE_MASKS = STANDARD.ADJACENT, STANDARD.VALUE_MASKS
+SYMMETRY_SQUARES, DIR_INDEX = STANDARD.SYMMETRY_SQUARES, STANDARD.DIR_INDEX
+
+from_board = STANDARD.from_board
+to_board = STANDARD.to_board
+to_move_tuple = STANDARD.to_move_tuple
+flat_zobrist = STANDARD.flat_zobrist
+calculate_hash = STANDARD.calculate_hash
+transform_move = STANDARD.transform_move
+symmetry_tables = STANDARD.symmetry_tables
+canonical_hash = STANDARD.canonical_hash
+gen_moves = STANDARD.gen_moves
+move_index = STANDARD.move_index
+make_move = Bitboards.make_move
+has_three = STANDARD.has_three
+game_status = STANDARD.game_status
+game_status_after = STANDARD.game_status_after
+count_runsoftwo = STANDARD.count_runsoftwo
+pos_score = STANDARD.pos_score
+count_forcing_threats = STANDARD.count_forcing_threats
+evaluate_v1 = STANDARD.evaluate_v1
+evaluate_v2 = STANDARD.evaluate_v2
@@ -0,0 +1,172 @@
+# book.py
+"""
+Opening book for both grids.
+
+Every game starts from the same position, so the first few moves are searched again every game. build() searches
+every position of the first N plies once, deeply, and writes position key -> best move and score to a file that
+the agents look their position up in before searching.
+
+Keys are canonical zobrist hashes (utils / utils_large.canonical_hash, mirrored positions share an entry and
+moves are stored for the canonical image) with the seeded tables of zobrist.py. The side to move is not in the key,
+it follows from the pieces (every move takes a piece to the other colour of square).
+
+File: 16 byte header (b'C3BK', width, height, number of entries) then the entries sorted by key, 16 bytes each:
+key, x, y, new_x, new_y, score (float32). A lookup is a binary search on the mmapped file.
+
+Build it with:
+python book.py --grid standard --plies 4 --depth 8 --path standard.book
+"""
+
+import argparse
+import mmap
+import struct
+import time
+
+import bitboard
+import utils
+import utils_large
+from agents import AlphaBetav2D
+from large import AlphaBetaV2DLarge
+from transposition import TranspositionTable
+from zobrist import zobrist_table
+
+HEADER = struct.Struct('<4sIII')
+ENTRY = struct.Struct('<QBBBBf')
+MAGIC = b'C3BK'
+
+
+def position_key(board, sym_tables):
+    """
+    (key, sym) of board, see utils.canonical_hash
+    """
+    if len(board) == 4:
+        return utils.canonical_hash(board, sym_tables)
+    return utils_large.canonical_hash(board, sym_tables)
+
+
+def transform_move(move, sym, board):
+    return utils.transform_move(move, sym, len(board[0]), len(board))
+
+
+# BUILDER -------------------------------------------------------------------------------------------------------------
+def _search_standard(agent, board, depth):
+    agent.board = board
+    white, black, init_hash, init_history = agent.setup_bb()
+    agent.root_depth = depth
+    score, move = agent.minimax_bb(white, black, depth, agent.player == 0, float('-inf'), float('inf'),
+                                   init_hash, init_history)
+    return score, bitboard.to_move_tuple(move) if move is not None else None
+
+
+def _search_large(agent, board, depth):
+    init_hash = utils_large.calculate_initial_hash(board, agent.zobrist_table)
+    return agent.minimax(board, depth, agent.player == 0, init_hash, {init_hash: 1}, float('-inf'), float('inf'))
+
+
+def build(grid, plies, depth, path):
+    """
+    searches every position of the first `plies` plies depth deep (ab2D on bitboards for the standard grid,
+    AlphaBetaV2DLarge for the large one) and writes the book to path
+    """
+    if grid == 'large':
+        agents = [AlphaBetaV2DLarge(0), AlphaBetaV2DLarge(1)]
+        for agent in agents:
+            agent.tt = TranspositionTable()
+        search, make_move, status = _search_large, utils_large.make_move, utils_large.game_status
+    else:
+        agents = [AlphaBetav2D(0), AlphaBetav2D(1)]
+        for agent in agents:
+            agent.use_bitboard = True
+        search, make_move, status = _search_standard, utils.make_move, utils.game_status
+    start_board = agents[0].board
+    height, width = len(start_board), len(start_board[0])
+    sym_tables = utils.symmetry_tables(zobrist_table(width, height))
+
+    entries = {}
+    key, sym = position_key(start_board, sym_tables)
+    # canonical key -> (symmetry, a board with that key)
+    layer = {key: (sym, start_board)}
+    start = time.perf_counter()
+    for ply in range(plies):
+        player = ply % 2
+        agent = agents[player]
+        next_layer = {}
+        for key, (sym, board) in layer.items():
+            score, move = search(agent, [row[:] for row in board], depth)
+            if move is not None:
+                entries[key] = (transform_move(move, sym, board), score)
+            for child_move in agent.gen_actions(board, player == 0):
+                child = make_move(board, child_move, player == 0)
+                if status(child) is None:
+                    child_key, child_sym = position_key(child, sym_tables)
+                    next_layer.setdefault(child_key, (child_sym, child))
+        print(f"ply {ply}: {len(layer)} positions ({time.perf_counter() - start:.0f}s)")
+        layer = next_layer
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, width, height, len(entries)))
+        for key in sorted(entries):
+            ((x, y), (new_x, new_y)), score = entries[key]
+            f.write(ENTRY.pack(key, x, y, new_x, new_y, score))
+    print(f"Wrote {len(entries)} positions to {path}")
+
+
+# LOOKUP --------------------------------------------------------------------------------------------------------------
+class Book:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.count = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+        self.sym_tables = utils.symmetry_tables(zobrist_table(self.width, self.height))
+        self.hits = 0
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def lookup(self, board):
+        """
+        (move, score) for board, None when it isn't in the book (or the book is for the other grid)
+        """
+        if len(board) != self.height or len(board[0]) != self.width:
+            return None
+        key, sym = position_key(board, self.sym_tables)
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            entry = ENTRY.unpack_from(self.data, HEADER.size + mid * ENTRY.size)
+            if entry[0] < key:
+                low = mid + 1
+            elif entry[0] > key:
+                high = mid
+            else:
+                self.hits += 1
+                _, x, y, new_x, new_y, score = entry
+                return transform_move(((x, y), (new_x, new_y)), sym, board), score
+        return None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build an opening book.")
+    parser.add_argument('--grid', type=str, default='standard', choices=['standard', 'large'],
+                        help="Board the book is for.")
+    parser.add_argument('--plies', type=int, default=4,
+                        help="Positions of the first N plies go in the book.")
+    parser.add_argument('--depth', type=int, default=None,
+                        help="Search depth per position (default 8 standard, 5 large).")
+    parser.add_argument('--path', type=str, default=None,
+                        help="Output file (default standard.book / large.book).")
+    args = parser.parse_args()
+
+    depth = args.depth if args.depth is not None else (5 if args.grid == 'large' else 8)
+    path = args.path if args.path is not None else f"{args.grid}.book"
+    build(args.grid, args.plies, depth, path)
@@ -0,0 +1,86 @@
+# evaltable.py
+"""
+Heuristic v2 of every 5x4 position, computed once.
+
+There are only 8,817,900 placements of 4 white and 4 black pieces and heuristic v2 is a function of the placement
+and of the player it's for, so the search can read it from a file instead of counting patterns at every leaf.
+Positions are indexed like the tablebase (tablebase.index, combinatorial number ranks of both piece sets).
+Only white's value is stored: black's value of a position is white's value of the same position with the colours
+swapped, which is in the table too, so value(mine, theirs) is table[index(mine, theirs)] for either player.
+Finished games are stored like the others, the search scores them before it gets to the heuristic.
+
+File: 16 byte header (b'C3EV', number of positions) then one float32 per position (about 35 MB). The values are
+multiples of 0.5 so float32 keeps them exactly.
+
+Build it with:
+python evaltable.py [path]
+"""
+
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+import bitboard
+import tablebase
+from tablebase import BLACK_SUBSETS, POSITIONS, WHITE_SUBSETS
+
+HEADER = struct.Struct('<4sI8x')
+MAGIC = b'C3EV'
+DEFAULT_PATH = 'connect3.ev'
+
+
+def build(path):
+    """
+    evaluates every position in index order and writes the table to path
+    """
+    values = array('f', bytes(4 * POSITIONS))
+    start = time.perf_counter()
+    idx = 0
+    for rank, white in enumerate(WHITE_SUBSETS):
+        free = [sq for sq in range(bitboard.SIZE) if not white >> sq & 1]
+        for subset in BLACK_SUBSETS:
+            black = 1 << free[subset[0]] | 1 << free[subset[1]] | 1 << free[subset[2]] | 1 << free[subset[3]]
+            values[idx] = bitboard.evaluate_v2(white, black)
+            idx += 1
+        if rank % 500 == 0:
+            print(f"{idx} positions ({time.perf_counter() - start:.0f}s)")
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, POSITIONS))
+        values.tofile(f)
+    print(f"Wrote {path} ({time.perf_counter() - start:.0f}s)")
+
+
+class EvalTable:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or count != POSITIONS:
+            raise ValueError(f"{path} is not a 5x4 heuristic table")
+        self.values = memoryview(self.data)[HEADER.size:HEADER.size + 4 * POSITIONS].cast('f')
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def value(self, mine, theirs):
+        """
+        heuristic v2 for the owner of mine, same value as bitboard.evaluate_v2(mine, theirs)
+        """
+        return self.values[tablebase.index(mine, theirs)]
+
+    def close(self):
+        self.values.release()
+        self.data.close()
+        self.file.close()
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    print(f"Evaluating {POSITIONS} positions...")
+    build(path)
@@ -0,0 +1,337 @@
+# evaluation.py
+"""
+Incremental heuristic for the make/unmake search (agent.incremental).
+
+heuristic_v2 calls count_forcing_threats, count_runsoftwo and pos_score for both players at every leaf, six scans of
+the whole board, but a move only changes two squares. Every term is a sum over small parts of the board:
+    pos_score: one value per piece
+    runs of two: one per pair of neighbouring squares
+    patterns / threats: one per line of three, from its squares and the squares next to its empty one
+IncrementalEval keeps the sums per player and after a move only looks again at what sees the two squares: the lines
+through them (for both players) and the lines next to them (only for the player who moved, a threat only looks for
+its own pieces). undo() puts the old sums and line values back without computing anything.
+
+The line code tables (agent.table_eval) are the other way to the same numbers: every full row, column and diagonal
+of the board is one base 3 number, and tables made once per line length give its runs and patterns in one lookup.
+
+Works on any rules module with WIDTH, HEIGHT and POS_VALUES (utils, utils_large), same values as their functions.
+"""
+
+ORTHOGONAL = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+# lines of three and runs of two: right, down, down-right, down-left
+LINE_DIRS = [(1, 0), (0, 1), (1, 1), (-1, 1)]
+
+# index of each sum in IncrementalEval.totals, + player
+PATTERNS = 0
+THREATS = 2
+RUNS = 4
+POS = 6
+
+
+class Geometry:
+    """
+    lines, pairs and neighbours of one board size, see geometry()
+    """
+    def __init__(self, width, height, pos_values):
+        self.pos_values = pos_values
+        squares = [(x, y) for y in range(height) for x in range(width)]
+        on_board = set(squares)
+
+        self.lines = []
+        for dx, dy in LINE_DIRS:
+            for x, y in squares:
+                line = ((x, y), (x + dx, y + dy), (x + 2 * dx, y + 2 * dy))
+                if line[2] in on_board:
+                    self.lines.append(line)
+        # threat_squares[line][k]: squares next to the k-th square of line, but not on line
+        self.threat_squares = []
+        for line in self.lines:
+            self.threat_squares.append([
+                [(x + dx, y + dy) for dx, dy in ORTHOGONAL if (x + dx, y + dy) in on_board
+                 and (x + dx, y + dy) not in line]
+                for x, y in line])
+
+        # squares that make a run of two with a square
+        self.pair_squares = {}
+        for x, y in squares:
+            self.pair_squares[(x, y)] = [(x + dx, y + dy) for dx, dy in LINE_DIRS + [(-dx, -dy) for dx, dy in LINE_DIRS]
+                                         if (x + dx, y + dy) in on_board]
+
+        through = {square: set() for square in squares}
+        near = {square: set() for square in squares}
+        for i, line in enumerate(self.lines):
+            for x, y in line:
+                through[(x, y)].add(i)
+                for dx, dy in ORTHOGONAL:
+                    if (x + dx, y + dy) in on_board:
+                        near[(x + dx, y + dy)].add(i)
+        # move -> (lines through its squares, lines only next to them)
+        self.move_lines = {}
+        for x, y in squares:
+            for dx, dy in ORTHOGONAL:
+                to = (x + dx, y + dy)
+                if to in on_board:
+                    lines_through = through[(x, y)] | through[to]
+                    lines_near = (near[(x, y)] | near[to]) - lines_through
+                    self.move_lines[((x, y), to)] = (sorted(lines_through), sorted(lines_near))
+
+
+_geometries = {}
+
+
+def geometry(rules):
+    """
+    the Geometry of a rules module, made once
+    """
+    key = (rules.WIDTH, rules.HEIGHT)
+    if key not in _geometries:
+        _geometries[key] = Geometry(rules.WIDTH, rules.HEIGHT, rules.POS_VALUES)
+    return _geometries[key]
+
+
+class IncrementalEval:
+    def __init__(self, rules, state, evaluation='v2'):
+        """
+        sums of state, which the search then keeps up to date with play() / undo().
+        The lines are only followed for heuristic v2, v1 is runs of two alone
+        """
+        self.geometry = geometry(rules)
+        self.track_lines = evaluation == 'v2'
+        lines = self.geometry.lines if self.track_lines else []
+        # values[player][line]: 0 nothing, 1 winning pattern, 2 forcing threat
+        self.values = [[self.line_value(state, i, player) for i in range(len(lines))] for player in (0, 1)]
+        self.totals = [0] * 8
+        for player in (0, 1):
+            self.totals[PATTERNS + player] = self.values[player].count(1)
+            self.totals[THREATS + player] = self.values[player].count(2)
+        for y, row in enumerate(state):
+            for x, piece in enumerate(row):
+                if piece is not None:
+                    self.totals[POS + piece] += self.geometry.pos_values[y][x]
+                    # every pair is seen from both of its squares
+                    self.totals[RUNS + piece] += sum(1 for nx, ny in self.geometry.pair_squares[(x, y)]
+                                                     if state[ny][nx] == piece)
+        self.totals[RUNS] //= 2
+        self.totals[RUNS + 1] //= 2
+        self.stack = []
+
+    def line_value(self, state, i, player):
+        """
+        2 if line i is two of player's pieces and an empty square next to another of its pieces (forcing threat),
+        1 for two pieces and an empty square otherwise (winning pattern), else 0
+        """
+        (x0, y0), (x1, y1), (x2, y2) = self.geometry.lines[i]
+        a, b, c = state[y0][x0], state[y1][x1], state[y2][x2]
+        if a is None:
+            if b != player or c != player:
+                return 0
+            empty = 0
+        elif b is None:
+            if a != player or c != player:
+                return 0
+            empty = 1
+        elif c is None:
+            if a != player or b != player:
+                return 0
+            empty = 2
+        else:
+            return 0
+        for x, y in self.geometry.threat_squares[i][empty]:
+            if state[y][x] == player:
+                return 2
+        return 1
+
+    def play(self, state, move):
+        """
+        updates the sums for move, which has just been played on state
+        """
+        (x, y), (new_x, new_y) = move
+        player = state[new_y][new_x]
+        geometry = self.geometry
+        totals = self.totals
+        changed = []
+        self.stack.append((totals[:], changed))
+
+        totals[POS + player] += geometry.pos_values[new_y][new_x] - geometry.pos_values[y][x]
+        # the pair of the two squares is never a run, one of them is always empty
+        left = sum(1 for nx, ny in geometry.pair_squares[(x, y)] if state[ny][nx] == player and (nx, ny) != move[1])
+        joined = sum(1 for nx, ny in geometry.pair_squares[(new_x, new_y)] if state[ny][nx] == player)
+        totals[RUNS + player] += joined - left
+        if not self.track_lines:
+            return
+
+        lines_through, lines_near = geometry.move_lines[move]
+        line_value = self.line_value
+        for owner in (0, 1):
+            values = self.values[owner]
+            for i in (lines_through + lines_near if owner == player else lines_through):
+                value = line_value(state, i, owner)
+                old = values[i]
+                if value != old:
+                    values[i] = value
+                    changed.append((values, i, old))
+                    if old:
+                        totals[(PATTERNS if old == 1 else THREATS) + owner] -= 1
+                    if value:
+                        totals[(PATTERNS if value == 1 else THREATS) + owner] += 1
+
+    def undo(self):
+        """
+        takes back the last play()
+        """
+        self.totals, changed = self.stack.pop()
+        for values, i, old in changed:
+            values[i] = old
+
+    def score(self, player, evaluation):
+        """
+        heuristic of the position for player, same value as MiniMaxAgent.heuristic_v1 / heuristic_v2
+        """
+        return score(self.totals, player, evaluation)
+
+
+def score(totals, player, evaluation):
+    """
+    heuristic for player from the sums (PATTERNS, THREATS, RUNS, POS + player) of a position
+    """
+    opp = 1 - player
+    if evaluation != 'v2':
+        return totals[RUNS + player] - totals[RUNS + opp]
+    def_factor = 1.5
+    my_threats, opp_threats = totals[THREATS + player], totals[THREATS + opp]
+
+    my_double = 100 if my_threats > 1 else 0
+    opp_double = 100 if opp_threats > 1 else 0
+
+    double_score = my_double - opp_double * def_factor
+    threat_score = 10 * (my_threats - opp_threats * def_factor)
+    pattern_score = 4 * (totals[PATTERNS + player] - totals[PATTERNS + opp] * def_factor)
+    runsoftwo_score = 1 * (totals[RUNS + player] - totals[RUNS + opp] * def_factor)
+    pos_score = 2 * (totals[POS + player] - totals[POS + opp] * def_factor)
+
+    return double_score + threat_score + pattern_score + runsoftwo_score + pos_score
+
+
+# LINE CODE TABLES ----------------------------------------------------------------------------------------------------
+# Every full row, column and diagonal (2 squares or more) is read as one base 3 number, empty 0, white 1, black 2,
+# first square the most significant digit. Tables per line length give for every code the runs of two of both
+# players and the 3 square windows with two pieces of one player and an empty square, so a whole board is one pass
+# over its lines. Only those windows still look at the board, a threat depends on the squares next to the empty one.
+CELL_CODES = {None: 0, 0: 1, 1: 2}
+
+_code_tables = {}
+
+
+def code_tables(length):
+    """
+    (runs, windows) for lines of length squares, made once per length:
+    runs[code]: (white runs of two, black runs of two)
+    windows[code]: tuple of (player, first square of the window, empty square in the window)
+    """
+    if length not in _code_tables:
+        runs = []
+        windows = []
+        for code in range(3 ** length):
+            cells = [code // 3 ** (length - 1 - k) % 3 for k in range(length)]
+            runs.append(tuple(sum(1 for k in range(length - 1) if cells[k] == cells[k + 1] == piece + 1)
+                              for piece in (0, 1)))
+            found = []
+            for start in range(length - 2):
+                window = cells[start:start + 3]
+                for piece in (0, 1):
+                    if window.count(piece + 1) == 2 and window.count(0) == 1:
+                        found.append((piece, start, window.index(0)))
+            windows.append(tuple(found))
+        _code_tables[length] = (runs, windows)
+    return _code_tables[length]
+
+
+class LineTables:
+    """
+    the full lines of one board size as flat square numbers (y * width + x), see line_tables()
+    """
+    def __init__(self, width, height, pos_values):
+        self.size = width * height
+        self.pos_values = [pos_values[sq // width][sq % width] for sq in range(self.size)]
+        self.lines = []
+        for dx, dy in LINE_DIRS:
+            for y in range(height):
+                for x in range(width):
+                    # lines start on a square whose previous square is off the board
+                    if 0 <= x - dx < width and 0 <= y - dy < height:
+                        continue
+                    line = []
+                    lx, ly = x, y
+                    while 0 <= lx < width and 0 <= ly < height:
+                        line.append(ly * width + lx)
+                        lx, ly = lx + dx, ly + dy
+                    if len(line) >= 2:
+                        self.lines.append(tuple(line))
+        self.tables = [code_tables(len(line)) for line in self.lines]
+        # threat_squares[line][(start, empty)]: squares next to the empty square of that window, but not in it
+        self.threat_squares = []
+        for line in self.lines:
+            squares = {}
+            for start in range(len(line) - 2):
+                window = line[start:start + 3]
+                for empty in range(3):
+                    x, y = window[empty] % width, window[empty] // width
+                    squares[(start, empty)] = [
+                        (y + dy) * width + x + dx for dx, dy in ORTHOGONAL
+                        if 0 <= x + dx < width and 0 <= y + dy < height and (y + dy) * width + x + dx not in window]
+            self.threat_squares.append(squares)
+
+
+_line_tables = {}
+
+
+def line_tables(rules):
+    """
+    the LineTables of a rules module, made once
+    """
+    key = (rules.WIDTH, rules.HEIGHT)
+    if key not in _line_tables:
+        _line_tables[key] = LineTables(rules.WIDTH, rules.HEIGHT, rules.POS_VALUES)
+    return _line_tables[key]
+
+
+def table_totals(rules, state, evaluation='v2'):
+    """
+    the sums of IncrementalEval (PATTERNS, THREATS, RUNS, POS + player) of state in one pass over its lines,
+    patterns and threats only for heuristic v2
+    """
+    tables = line_tables(rules)
+    flat = [CELL_CODES[cell] for row in state for cell in row]
+    totals = [0] * 8
+    # heuristic v1 is runs of two alone
+    v2 = evaluation == 'v2'
+    if v2:
+        pos_values = tables.pos_values
+        for sq in range(tables.size):
+            if flat[sq]:
+                totals[POS + flat[sq] - 1] += pos_values[sq]
+
+    for line, (runs, windows), threat_squares in zip(tables.lines, tables.tables, tables.threat_squares):
+        code = 0
+        for sq in line:
+            code = code * 3 + flat[sq]
+        white_runs, black_runs = runs[code]
+        totals[RUNS] += white_runs
+        totals[RUNS + 1] += black_runs
+        if v2:
+            for piece, start, empty in windows[code]:
+                cell = piece + 1
+                for sq in threat_squares[(start, empty)]:
+                    if flat[sq] == cell:
+                        totals[THREATS + piece] += 1
+                        break
+                else:
+                    totals[PATTERNS + piece] += 1
+    return totals
+
+
+def table_score(rules, state, player, evaluation='v2'):
+    """
+    heuristic of state for player with the line code tables, same value as MiniMaxAgent.heuristic_v1 / heuristic_v2
+    """
+    return score(table_totals(rules, state, evaluation), player, evaluation)
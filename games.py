@@ -2,54 +2,84 @@
 
 import time
 import utils
-import random
-from agents import MiniMaxAgent, MiniMaxAgentD, AlphaBeta, AlphaBetaD, MiniMaxAgentV2, AlphaBetaV2, MiniMaxv2D, AlphaBetav2D
+from agents import make_agent
 import utils_large
 from large import AlphaBetaV2DLarge
+from transposition import TranspositionTable, MOVE_SQUARES, MOVE_COORDS
+from tablebase import Tablebase
+from evaltable import EvalTable
+from book import Book
+from timecontrol import TimeManager
+from ponder import Ponderer
 
 
 
 class Connect3M:
-    def __init__(self, model, human_player):
+    def __init__(self, model, human_player, bitboard=False, make_unmake=False, tt_size=1 << 20, tt_replacement='depth',
+                 time_limit=None, pvs=False, workers=1, parallel='split', tablebase=None, book=None,
+                 symmetry=False, incremental=False, table_eval=False, eval_table=None,
+                 batch_eval=False, tt_file=None):
         self.human_player = human_player
         self.ai_player = 1 - human_player
         
-        self.board = [
-            [0, None, None, None, 1],
-            [1, None, None, None, 0],
-            [0, None, None, None, 1],
-            [1, None, None, None, 0],
-        ]
-        self.zobrist_table = [[[random.getrandbits(64) for _ in range(5)] for _ in range(4)] for _ in range(2)]
-        initial_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-        self.board_history = {initial_hash: 1}
-        
-        if model == 'mm':
-            self.agent = MiniMaxAgent(player=self.ai_player)
-        elif model == 'mmD':
-            self.agent = MiniMaxAgentD(player=self.ai_player)
-        elif model == 'mm2':
-            self.agent = MiniMaxAgentV2(player=self.ai_player)
-        elif model == 'mm2D':
-            self.agent = MiniMaxv2D(player=self.ai_player)
-        elif model == 'ab':
-            self.agent = AlphaBeta(player=self.ai_player)
-        elif model == 'abD':
-            self.agent = AlphaBetaD(player=self.ai_player)
-        elif model == 'ab2':
-            self.agent = AlphaBetaV2(player=self.ai_player)
-        elif model == 'ab2D':
-            self.agent = AlphaBetav2D(player=self.ai_player)
+        self.agent = make_agent(model, self.ai_player)
+        # one board for the game and the agent, hashed and counted for repetitions as moves are applied
+        self.state = self.agent.state
+        self.agent.use_bitboard = bitboard
+        self.agent.make_unmake = make_unmake
+        self.agent.pvs = pvs and self.agent.pruning
+        self.agent.workers = workers
+        self.agent.parallel = parallel
+        if self.agent.tt is not None:
+            self.agent.tt = TranspositionTable(tt_size, tt_replacement)
+        if tablebase is not None:
+            self.agent.tablebase = Tablebase(tablebase)
+        if book is not None:
+            self.agent.book = Book(book)
+        self.agent.symmetry = symmetry
+        self.agent.incremental = incremental
+        self.agent.table_eval = table_eval
+        if eval_table is not None:
+            self.agent.eval_table = EvalTable(eval_table)
+        if batch_eval:
+            # numpy is only needed for this
+            from batcheval import BatchEval
+            self.agent.batch_eval = BatchEval(self.agent.rules)
+        # after the evaluation is set up, the file has to be one saved by the same agent
+        self.model = model
+        self.tt_file = tt_file
+        self.load_tt()
+        # fixed depth 6, or iterative deepening for time_limit seconds per move
+        self.time_limit = time_limit
+        self.search_depth = 6 if time_limit is None else None
         
         self.current_player = 0
         self.game_over = False
 
     def display_board(self):
         print("\nCurrent Board State:")
-        for row in self.board:
+        for row in self.state.board:
             display_row = ['0' if c == 0 else '1' if c == 1 else ' ' for c in row]
             print(' , '.join(display_row))
         print("-" * 20)
+
+    def load_tt(self):
+        """
+        the table saved by earlier games of the same agent (model, side, evaluation), bitboard and list board
+        searches store their moves differently
+        """
+        if self.tt_file is None or self.agent.tt is None:
+            return
+        if self.agent.tt.load_file(self.tt_file, MOVE_SQUARES if self.agent.use_bitboard else MOVE_COORDS,
+                                   self.agent.tt_identity(self.model)):
+            print(f"Loaded transposition table {self.tt_file}")
+
+    def save_tt(self):
+        if self.tt_file is None or self.agent.tt is None:
+            return
+        count = self.agent.tt.save_file(self.tt_file)
+        if count is not None:
+            print(f"Saved {count} transposition table entries to {self.tt_file}")
         
     def play(self):
         print("Welcome to Dynamic Connect-3!")
@@ -62,7 +92,7 @@ class Connect3M:
             
             if self.current_player == self.ai_player:
                 print(f"\nPlayer {player_name} (AI) is thinking...")
-                move_str = self.agent.find_best_move(depth=6)
+                move_str = self.agent.find_best_move(depth=self.search_depth, time_limit=self.time_limit)
                 print(f"AI chose move: {move_str}")
             else:
                 move_str = input(f"Player {player_name} (You), enter your move (e.g., '14E'): ")
@@ -72,40 +102,23 @@ class Connect3M:
                 self.game_over = True
                 continue
 
-            # Perform the move
-            try:
-                start_x, start_y = int(move_str[0]) - 1, int(move_str[1]) - 1
-                direction = move_str[2].upper()
-                dx, dy = self.agent.dirs[direction] # Use agent's dirs
-                end_x, end_y = start_x + dx, start_y + dy
-                
-                # in board check, free space etc
-                if not (utils.in_board(start_x, start_y) and utils.in_board(end_x, end_y) and \
-                        self.board[start_y][start_x] == self.current_player and self.board[end_y][end_x] is None):
-                    print("!!! Invalid Move !!!")
+            # Perform the move (the agent's find_best_move already played its own on the shared state)
+            if self.current_player == self.human_player:
+                move = self.state.parse(move_str, self.current_player)
+                if move is None:
+                    print("!!! Invalid Move, use <x><y><direction> with one of your pieces (e.g., '14E') !!!")
                     continue
-                
-                self.board[end_y][end_x] = self.current_player
-                self.board[start_y][start_x] = None
-                
-                if self.current_player == self.human_player:
-                    self.agent.update_board_opp(move_str)
-            
-            except (ValueError, KeyError, IndexError):
-                print("!!! Invalid move format. Please use <x><y><direction> (e.g., '14E'). !!!")
-                continue
+                self.state.apply(move)
 
             # Check for win
-            if utils.check_win(self.board, self.current_player):
+            if utils.check_win(self.state.board, self.current_player):
                 self.game_over = True
                 self.display_board()
                 print(f"\nGame Over! Player {player_name} wins!")
                 continue
 
             # Check for draw
-            current_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-            self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
-            if self.board_history[current_hash] >= 3:
+            if self.state.repetitions() >= 3:
                 self.game_over = True
                 self.display_board()
                 print("\nGame Over! It's a draw by threefold repetition.")
@@ -115,6 +128,8 @@ class Connect3M:
             self.current_player = 1 - self.current_player
 
         print("\nThanks for playing!")
+        self.save_tt()
+        self.agent.close()
 
 
 # In games.py --  GEMINI GENERATED From this point below
@@ -124,35 +139,64 @@ class Connect3MServer(Connect3M):
     Manages a game instance that communicates moves through a server.
     This version is robustly designed to ignore non-move echo messages.
     """
-    def __init__(self, model, my_player_id, sock):
-        super().__init__(model, human_player=my_player_id)
+    def __init__(self, model, my_player_id, sock, game_time=None, increment=0.0, ponder=None, tt_file=None,
+                 **options):
+        super().__init__(model, human_player=my_player_id, **options)
         self.sock = sock
         self.agent.player = my_player_id
+        # the saved table is our side's, loaded once the agent plays it
+        self.tt_file = tt_file
+        self.load_tt()
         # Keep track of the last move we sent to ignore its echo
         self.last_move_sent = None
+        # game_time seconds for the whole game (+ increment per move): the clock decides how long every move takes
+        self.clock = None
+        if game_time is not None:
+            self.clock = TimeManager(game_time, increment)
+            self.agent.clock = self.clock
+        # search the opponent's replies while waiting for them (ponder.py)
+        self.ponderer = Ponderer(self.agent, ponder) if ponder is not None else None
         print(f"Initialized server game. This client is Player {my_player_id}.")
 
+    def _think(self, depth):
+        """
+        our move as sent to the server, searched depth deep (or for time_limit) or for what the clock gives it.
+        A reply pondered deep enough is answered straight away (with the clock on, the little time it took is still
+        charged), unless the tablebase or the book has a move
+        """
+        answer = self.ponderer.finish(self.state.last_move) if self.ponderer is not None else None
+        if self.clock is None:
+            return self._answer(answer, depth, self.time_limit, self.time_limit)
+        time_limit = self.clock.start_move(len(self.agent.root_moves()))
+        move_str = self._answer(answer, None, time_limit, self.clock.target)
+        print(f"Move took {self.clock.end_move():.2f}s")
+        return move_str
+
+    def _answer(self, answer, depth, time_limit, target):
+        """
+        plays the pondered answer if it is deep enough for a search of depth or target seconds (Ponderer.deep_enough),
+        searches otherwise
+        """
+        if self.ponderer is not None and self.ponderer.deep_enough(answer, depth, target):
+            # the tablebase and the book know better than any search, as in find_best_move
+            known_move = self.agent.tablebase_move() or self.agent.book_move()
+            if known_move is not None:
+                return self.agent.play_move(known_move)
+            print(f"Agent {self.agent.player} pondered move: {answer[2]} with score: {answer[1]} (depth {answer[0]})")
+            return self.agent.play_move(answer[2])
+        return self.agent.find_best_move(depth=depth, time_limit=time_limit)
+
     def _apply_local_move(self, move_str, player_id):
         """
-        Applies a move string to the local board.
-        Returns True on success, False on failure (invalid format).
+        Applies a move string to the shared game state.
+        Returns True on success, False if it isn't a move of player_id (non-move strings like "game01 black").
         """
-        try:
-            # A valid move must be a 3-character string
-            if not isinstance(move_str, str) or len(move_str) != 3:
-                return False
-            start_x, start_y = int(move_str[0]) - 1, int(move_str[1]) - 1
-            direction = move_str[2].upper()
-            dx, dy = self.agent.dirs[direction]
-            end_x, end_y = start_x + dx, start_y + dy
-            
-            # Additional validation can be added here if needed
-            self.board[end_y][end_x] = player_id
-            self.board[start_y][start_x] = None
-            return True
-        except (ValueError, KeyError, IndexError, TypeError):
-            # This will catch errors from non-move strings like "game01 black"
+        move = self.state.parse(move_str, player_id)
+        if move is None:
             return False
+        self.state.apply(move)
+        print(f"opponent moved: {move_str}")
+        return True
 
     def play(self):
         """
@@ -163,15 +207,13 @@ class Connect3MServer(Connect3M):
         
         if self.agent.player == 0:
             print("We are Player 0. Calculating the first move.")
-            move_to_send = self.agent.find_best_move(depth=6)
+            move_to_send = self._think(self.search_depth)
             if move_to_send:
-                self._apply_local_move(move_to_send, self.agent.player)
+                # find_best_move played it on the shared state
                 self.last_move_sent = move_to_send
                 utils.send_move(self.sock, move_to_send)
-
-                # Check for draw after our first move
-                current_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-                self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
+                if self.ponderer is not None:
+                    self.ponderer.start()
         
         while not self.game_over:
             self.display_board()
@@ -187,16 +229,13 @@ class Connect3MServer(Connect3M):
                     print(f"Ignoring echo of our own move: {message}")
                     continue
                 if self._apply_local_move(message, self.ai_player):
-                    self.agent.update_board_opp(message)
                     break
                 else:
                     print(f"Ignoring non-move message from server: '{message}'")
             
             if self.game_over: continue
 
-            current_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-            self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
-            if self.board_history[current_hash] >= 3:
+            if self.state.repetitions() >= 3:
                 self.game_over = True
                 self.display_board()
                 print("\nGame Over! It's a draw by threefold repetition.")
@@ -205,28 +244,33 @@ class Connect3MServer(Connect3M):
             self.display_board()
 
             print("Opponent has moved. Calculating our response...")
-            move_to_send = self.agent.find_best_move(depth=6)
+            move_to_send = self._think(self.search_depth)
             if not move_to_send:
                 self.game_over = True
                 continue
             
-            self._apply_local_move(move_to_send, self.agent.player)
             self.last_move_sent = move_to_send
             utils.send_move(self.sock, move_to_send)
+            if self.ponderer is not None:
+                self.ponderer.start()
 
-            current_hash = utils.calculate_initial_hash(self.board, self.zobrist_table)
-            self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
-            if self.board_history[current_hash] >= 3:
+            if self.state.repetitions() >= 3:
                 self.game_over = True
                 self.display_board()
                 print("\nGame Over! It's a draw by threefold repetition.")
                 continue
 
+        if self.ponderer is not None:
+            self.ponderer.finish(None)
         print("\nNetwork game has ended.")
+        self.save_tt()
+        self.agent.close()
 
 
 class Connect3L:
-    def __init__(self, model, human_player):
+    def __init__(self, model, human_player, tt_size=1 << 20, tt_replacement='depth', time_limit=None, pvs=False,
+                 workers=1, parallel='split', book=None, symmetry=False, incremental=False, table_eval=False,
+                 batch_eval=False, tt_file=None):
         self.human_player = human_player
         self.ai_player = 1 - human_player
         
@@ -235,23 +279,56 @@ class Connect3L:
             self.agent = AlphaBetaV2DLarge(player=self.ai_player)
         else:
             raise ValueError(f"Model '{model}' not supported for the large grid.")
-
-        self.board = self.agent.board
-        self.zobrist_table = self.agent.zobrist_table
-        
-        initial_hash = utils_large.calculate_initial_hash(self.board, self.zobrist_table)
-        self.board_history = {initial_hash: 1}
+        self.agent.tt = TranspositionTable(tt_size, tt_replacement)
+        self.agent.pvs = pvs
+        self.agent.workers = workers
+        self.agent.parallel = parallel
+        if book is not None:
+            self.agent.book = Book(book)
+        self.agent.symmetry = symmetry
+        self.agent.incremental = incremental
+        self.agent.table_eval = table_eval
+        if batch_eval:
+            from batcheval import BatchEval
+            self.agent.batch_eval = BatchEval(self.agent.rules)
+        # the agent searches on bitboards, these only work on the list board
+        if incremental or table_eval or batch_eval:
+            self.agent.use_bitboard = False
+        # fixed depth 6 (4 in server games on the list board), or iterative deepening for time_limit seconds per move
+        self.time_limit = time_limit
+        self.search_depth = 6 if time_limit is None else None
+        self.server_depth = (6 if self.agent.use_bitboard else 4) if time_limit is None else None
+        self.model = model
+        self.tt_file = tt_file
+        self.load_tt()
+
+        # one board for the game and the agent, hashed and counted for repetitions as moves are applied
+        self.state = self.agent.state
         
         self.current_player = 0
         self.game_over = False
 
     def display_board(self):
         print("\nCurrent Board State (7x6):")
-        for row in self.board:
+        for row in self.state.board:
             # Adjust display for potentially wider rows
             display_row = ['0' if c == 0 else '1' if c == 1 else ' ' for c in row]
             print(' , '.join(display_row))
         print("-" * 28)
+
+    def load_tt(self):
+        if self.tt_file is None:
+            return
+        if self.agent.tt.load_file(self.tt_file, MOVE_SQUARES if self.agent.use_bitboard else MOVE_COORDS,
+                                   self.agent.tt_identity(self.model)):
+            print(f"Loaded transposition table {self.tt_file}")
+
+    def save_tt(self):
+        if self.tt_file is None:
+            return
+        count = self.agent.tt.save_file(self.tt_file)
+        if count is not None:
+            print(f"Saved {count} transposition table entries to {self.tt_file}")
         
     def play(self):
         print("Welcome to Dynamic Connect-3 (Large Grid)!")
@@ -264,7 +341,7 @@ class Connect3L:
             
             if self.current_player == self.ai_player:
                 print(f"\nPlayer {player_name} (AI) is thinking...")
-                move_str = self.agent.find_best_move(depth=6) # Using a lower depth for performance on larger board
+                move_str = self.agent.find_best_move(depth=self.search_depth, time_limit=self.time_limit)
                 print(f"AI chose move: {move_str}")
             else:
                 move_str = input(f"Player {player_name} (You), enter your move (e.g., '22E'): ")
@@ -274,36 +351,21 @@ class Connect3L:
                 self.game_over = True
                 continue
 
-            try:
-                start_x, start_y = int(move_str[0]) - 1, int(move_str[1]) - 1
-                direction = move_str[2].upper()
-                dx, dy = self.agent.dirs[direction]
-                end_x, end_y = start_x + dx, start_y + dy
-                
-                if not (utils_large.in_board(start_x, start_y) and utils_large.in_board(end_x, end_y) and \
-                        self.board[start_y][start_x] == self.current_player and self.board[end_y][end_x] is None):
-                    print("!!! Invalid Move !!!")
+            # the agent's find_best_move already played its own move on the shared state
+            if self.current_player == self.human_player:
+                move = self.state.parse(move_str, self.current_player)
+                if move is None:
+                    print("!!! Invalid Move, use <x><y><direction> with one of your pieces (e.g., '22E') !!!")
                     continue
-                
-                self.board[end_y][end_x] = self.current_player
-                self.board[start_y][start_x] = None
-                
-                if self.current_player == self.human_player:
-                    self.agent.update_board_opp(move_str)
-            
-            except (ValueError, KeyError, IndexError):
-                print("!!! Invalid move format. Please use <x><y><direction> (e.g., '22E'). !!!")
-                continue
+                self.state.apply(move)
 
-            if utils_large.check_win(self.board, self.current_player):
+            if utils_large.check_win(self.state.board, self.current_player):
                 self.game_over = True
                 self.display_board()
                 print(f"\nGame Over! Player {player_name} wins!")
                 continue
 
-            current_hash = utils_large.calculate_initial_hash(self.board, self.zobrist_table)
-            self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
-            if self.board_history[current_hash] >= 3:
+            if self.state.repetitions() >= 3:
                 self.game_over = True
                 self.display_board()
                 print("\nGame Over! It's a draw by threefold repetition.")
@@ -312,43 +374,70 @@ class Connect3L:
             self.current_player = 1 - self.current_player
 
         print("\nThanks for playing!")
+        self.save_tt()
+        self.agent.close()
 
 class Connect3LServer(Connect3L):
     """
     Manages a large grid (7x6) game instance that communicates moves through a server.
     """
-    def __init__(self, model, my_player_id, sock):
-        super().__init__(model, human_player=my_player_id)
+    def __init__(self, model, my_player_id, sock, game_time=None, increment=0.0, ponder=None, tt_file=None,
+                 **options):
+        super().__init__(model, human_player=my_player_id, **options)
         self.sock = sock
         self.agent.player = my_player_id # Ensure agent knows its player ID
         self.ai_player = 1 - my_player_id # Correctly set opponent player ID
+        # the saved table is our side's, loaded once the agent plays it
+        self.tt_file = tt_file
+        self.load_tt()
         self.last_move_sent = None
+        self.clock = None
+        if game_time is not None:
+            self.clock = TimeManager(game_time, increment)
+            self.agent.clock = self.clock
+        # search the opponent's replies while waiting for them (ponder.py)
+        self.ponderer = Ponderer(self.agent, ponder) if ponder is not None else None
         print(f"Initialized large grid server game. This client is Player {my_player_id}.")
 
+    def _think(self, depth):
+        """
+        our move, searched depth deep (or for time_limit) or for what the clock gives it.
+        A reply pondered deep enough is answered straight away (with the clock on, the little time it took is still
+        charged), unless the tablebase or the book has a move
+        """
+        answer = self.ponderer.finish(self.state.last_move) if self.ponderer is not None else None
+        if self.clock is None:
+            return self._answer(answer, depth, self.time_limit, self.time_limit)
+        time_limit = self.clock.start_move(len(self.agent.root_moves()))
+        move_str = self._answer(answer, None, time_limit, self.clock.target)
+        print(f"Move took {self.clock.end_move():.2f}s")
+        return move_str
+
+    def _answer(self, answer, depth, time_limit, target):
+        """
+        plays the pondered answer if it is deep enough for a search of depth or target seconds (Ponderer.deep_enough),
+        searches otherwise
+        """
+        if self.ponderer is not None and self.ponderer.deep_enough(answer, depth, target):
+            # the tablebase and the book know better than any search, as in find_best_move
+            known_move = self.agent.tablebase_move() or self.agent.book_move()
+            if known_move is not None:
+                return self.agent.play_move(known_move)
+            print(f"Agent {self.agent.player} pondered move: {answer[2]} with score: {answer[1]} (depth {answer[0]})")
+            return self.agent.play_move(answer[2])
+        return self.agent.find_best_move(depth=depth, time_limit=time_limit)
+
     def _apply_local_move(self, move_str, player_id):
         """
-        Applies a move string to the local 7x6 board.
-        Returns True on success, False on failure.
+        Applies a move string to the shared 7x6 game state.
+        Returns True on success, False if it isn't a move of player_id.
         """
-        try:
-            if not isinstance(move_str, str) or len(move_str) != 3:
-                return False
-            start_x, start_y = int(move_str[0]) - 1, int(move_str[1]) - 1
-            direction = move_str[2].upper()
-            dx, dy = self.agent.dirs[direction]
-            end_x, end_y = start_x + dx, start_y + dy
-
-            # Basic validation: ensure the move is within bounds and the target is empty
-            if not (utils_large.in_board(start_x, start_y) and utils_large.in_board(end_x, end_y) and \
-                    self.board[start_y][start_x] == player_id and self.board[end_y][end_x] is None):
-                print(f"Invalid move received or out of sync: {move_str} for player {player_id}")
-                return False
-
-            self.board[end_y][end_x] = player_id
-            self.board[start_y][start_x] = None
-            return True
-        except (ValueError, KeyError, IndexError, TypeError):
+        move = self.state.parse(move_str, player_id)
+        if move is None:
             return False
+        self.state.apply(move)
+        print(f"opponent moved: {move_str}")
+        return True
 
     def play(self):
         """ The main game loop for a server-based 7x6 game. """
@@ -357,16 +446,13 @@ class Connect3LServer(Connect3L):
         # If we are Player 0 (White), we make the first move.
         if self.agent.player == 0:
             print("We are Player 0. Calculating the first move.")
-            move_to_send = self.agent.find_best_move(depth=4)
+            move_to_send = self._think(self.server_depth)
             if move_to_send:
-                # We apply our own move differently since agent already updated its internal board
-                # This line is removed: self._apply_local_move(move_to_send, self.agent.player)
-                self.board = self.agent.board # Sync the game board with the agent's board
+                # find_best_move played it on the shared state
                 self.last_move_sent = move_to_send
                 utils.send_move(self.sock, move_to_send)
-
-                current_hash = utils_large.calculate_initial_hash(self.board, self.zobrist_table)
-                self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
+                if self.ponderer is not None:
+                    self.ponderer.start()
         
         while not self.game_over:
             self.display_board()
@@ -383,7 +469,6 @@ class Connect3LServer(Connect3L):
                     continue
                 # Apply opponent's move to our local board
                 if self._apply_local_move(message, self.ai_player):
-                    self.agent.update_board_opp(message)
                     break
                 else:
                     print(f"Ignoring non-move message from server: '{message}'")
@@ -391,9 +476,7 @@ class Connect3LServer(Connect3L):
             if self.game_over: continue
 
             # Check for draw by threefold repetition after opponent's move
-            current_hash = utils_large.calculate_initial_hash(self.board, self.zobrist_table)
-            self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
-            if self.board_history[current_hash] >= 3:
+            if self.state.repetitions() >= 3:
                 self.game_over = True
                 self.display_board()
                 print("\nGame Over! It's a draw by threefold repetition.")
@@ -402,24 +485,27 @@ class Connect3LServer(Connect3L):
             self.display_board()
 
             print("Opponent has moved. Calculating our response...")
-            move_to_send = self.agent.find_best_move(depth=4)
+            move_to_send = self._think(self.server_depth)
             if not move_to_send:
                 self.game_over = True
                 print("AI has no moves and forfeits.")
                 continue
             
-            # The agent's find_best_move already updated its internal board. We just sync it.
-            self.board = self.agent.board
+            # The agent's find_best_move already played it on the shared state
             self.last_move_sent = move_to_send
             utils.send_move(self.sock, move_to_send)
+            if self.ponderer is not None:
+                self.ponderer.start()
 
             # Check for draw after our move
-            current_hash = utils_large.calculate_initial_hash(self.board, self.zobrist_table)
-            self.board_history[current_hash] = self.board_history.get(current_hash, 0) + 1
-            if self.board_history[current_hash] >= 3:
+            if self.state.repetitions() >= 3:
                 self.game_over = True
                 self.display_board()
                 print("\nGame Over! It's a draw by threefold repetition.")
                 continue
 
-        print("\nNetwork game has ended.")
\ No newline at end of file
+        if self.ponderer is not None:
+            self.ponderer.finish(None)
+        print("\nNetwork game has ended.")
+        self.save_tt()
+        self.agent.close()
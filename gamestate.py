@@ -0,0 +1,77 @@
+# gamestate.py
+"""
+The position of a game, shared by the game loop (games.py) and its agent.
+
+One board, its zobrist hash and how many times every position of the game has been on the board. Moves are applied
+in place and the hash and repetition counts follow them, so nobody hashes the whole board or keeps a second copy of
+it: the game applies the opponent's moves, the agent applies its own (play_move) and searches from state.history,
+which is the repetition history of the whole game.
+
+Works on any rules module with calculate_initial_hash, apply_move, enter_position and parse_move_string (utils,
+utils_large).
+"""
+
+import copy
+import importlib
+
+
+class GameState:
+    def __init__(self, rules, board, zobrist_table):
+        self.rules = rules
+        self.zobrist_table = zobrist_table
+        self.set_board(board)
+
+    def __getstate__(self):
+        # modules don't pickle (parallel.py sends agents to worker processes), the name does
+        state = self.__dict__.copy()
+        state['rules'] = self.rules.__name__
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.rules = importlib.import_module(state['rules'])
+
+    def set_board(self, board):
+        """
+        starts over from a copy of board, the only position seen so far
+        """
+        self.board = [row[:] for row in board]
+        self.hash = self.rules.calculate_initial_hash(self.board, self.zobrist_table)
+        self.history = {self.hash: 1}
+        self.plies = 0
+        self.last_move = None
+
+    def copy(self):
+        """
+        a state of its own to search from (ponder.py), same position and history
+        """
+        other = copy.copy(self)
+        other.board = [row[:] for row in self.board]
+        other.history = self.history.copy()
+        return other
+
+    def parse(self, move_str, player):
+        """
+        "14E" -> ((0, 3), (1, 3)) if it's a legal move of player's here, None otherwise (server messages that
+        aren't moves, echoes of the other player's move, typos)
+        """
+        try:
+            move = self.rules.parse_move_string(move_str)
+        except (KeyError, TypeError):
+            return None
+        (x, y), (new_x, new_y) = move
+        if self.board[y][x] != player or self.board[new_y][new_x] is not None:
+            return None
+        return move
+
+    def apply(self, move):
+        """
+        plays move on the board, returns how many times the new position has been on it (3 = draw)
+        """
+        self.hash = self.rules.apply_move(self.board, move, self.hash, self.zobrist_table)
+        self.plies += 1
+        self.last_move = move
+        return self.rules.enter_position(self.history, self.hash)
+
+    def repetitions(self):
+        return self.history[self.hash]
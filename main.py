@@ -8,6 +8,12 @@ from games import Connect3M, Connect3L, Connect3MServer, Connect3LServer
 def play_local_game(args):
     """Handles the setup and execution of a local, interactive game."""
     # Logic to select grid size and model
+    game_options = {'workers': args.workers, 'parallel': args.parallel, 'book': args.book,
+                    'symmetry': args.symmetry, 'incremental': args.incremental,
+                    'table_eval': args.table_eval,
+                    'batch_eval': args.batch_eval, 'tt_size': args.tt_size,
+                    'tt_replacement': args.tt_replacement, 'time_limit': args.time_limit, 'pvs': args.pvs,
+                    'tt_file': args.tt_file}
     if args.grid == 'large':
         print("Large grid selected. The only available model is 'ab2D'.")
         model = 'ab2D'
@@ -15,6 +21,10 @@ def play_local_game(args):
     else: # standard grid
         model = str(input("Choose your model ('mm', 'mmD', 'mm2', 'mm2D', 'ab', 'abD', 'ab2', 'ab2D'): "))
         game_class = Connect3M
+        game_options['bitboard'] = args.bitboard
+        game_options['make_unmake'] = args.make_unmake
+        game_options['tablebase'] = args.tablebase
+        game_options['eval_table'] = args.eval_table
 
     while True:
         try:
@@ -28,7 +38,7 @@ def play_local_game(args):
             print("Invalid input. Please enter a number.")
 
     # Instantiate the correct game class
-    game = game_class(model=model, human_player=human_player)
+    game = game_class(model=model, human_player=human_player, **game_options)
     game.play()
 
 def play_server_game(args):
@@ -42,6 +52,16 @@ def play_server_game(args):
     print(f"Attempting to connect to server at {host}:{port}...")
 
     # Logic to select correct model and game class based on grid size
+    game_options = {'workers': args.workers, 'parallel': args.parallel, 'book': args.book,
+                    'symmetry': args.symmetry, 'incremental': args.incremental,
+                    'table_eval': args.table_eval,
+                    'batch_eval': args.batch_eval, 'tt_size': args.tt_size,
+                    'tt_replacement': args.tt_replacement, 'time_limit': args.time_limit, 'pvs': args.pvs,
+                    'tt_file': args.tt_file}
+    # the game clock and pondering, server games only
+    game_options['game_time'] = args.game_time
+    game_options['increment'] = args.increment
+    game_options['ponder'] = args.ponder
     if args.grid == 'large':
         print("Large grid selected for server play. Model is 'ab2D'.")
         model = 'ab2D'
@@ -49,6 +69,10 @@ def play_server_game(args):
     else:
         model = str(input("Choose AI model for this client ('mm', 'mmD', 'mm2', 'mm2D', 'ab', 'abD', 'ab2', 'ab2D'): "))
         server_game_class = Connect3MServer
+        game_options['bitboard'] = args.bitboard
+        game_options['make_unmake'] = args.make_unmake
+        game_options['tablebase'] = args.tablebase
+        game_options['eval_table'] = args.eval_table
 
     color = str(input("Choose color for this client ('white' or 'black'): ")).lower()
     if color not in ['white', 'black']:
@@ -66,7 +90,7 @@ def play_server_game(args):
             utils.send_move(s, initial_message)
 
             # Instantiate the correct server game client
-            game_client = server_game_class(model=model, my_player_id=my_player_id, sock=s)
+            game_client = server_game_class(model=model, my_player_id=my_player_id, sock=s, **game_options)
             game_client.play()
 
         except ConnectionRefusedError:
@@ -86,6 +110,46 @@ if __name__ == '__main__':
                         help="Game ID for the server.")
     parser.add_argument('--host_number', type=int, default=1, choices=range(1, 11),
                         help="Specify the server machine number (1-10) for the prof's server.")
+    parser.add_argument('--bitboard', action='store_true',
+                        help="Search on bitboards instead of the list board (standard grid only).")
+    parser.add_argument('--make_unmake', action='store_true',
+                        help="Search on one list board with make/unmake instead of copying it (standard grid only).")
+    parser.add_argument('--tt_size', type=int, default=1 << 20,
+                        help="Number of transposition table slots for 'ab2' and 'ab2D'.")
+    parser.add_argument('--tt_replacement', type=str, default='depth', choices=['depth', 'always'],
+                        help="Transposition table replacement: keep the deeper entry or always the newest.")
+    parser.add_argument('--tt_file', type=str, default=None,
+                        help="Transposition table file, read at startup and written back at the end of the game. "
+                             "One file per grid, model, side, move kind and evaluation, another agent's file is left "
+                             "alone with a warning.")
+    parser.add_argument('--time_limit', type=float, default=None,
+                        help="Seconds per move, searches deeper until the time is up instead of a fixed depth 6.")
+    parser.add_argument('--game_time', type=float, default=None,
+                        help="Server games: seconds on our clock for the whole game, every move gets a share of it.")
+    parser.add_argument('--increment', type=float, default=0.0,
+                        help="Server games: seconds added to our clock after every move (with --game_time).")
+    parser.add_argument('--ponder', type=str, default=None, choices=['predicted', 'all'],
+                        help="Server games: search the opponent's expected reply (or all replies) while waiting for it.")
+    parser.add_argument('--pvs', action='store_true',
+                        help="Principal variation search with aspiration windows for the alpha beta models.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes sharing the root moves of every search, 1 searches serially.")
+    parser.add_argument('--parallel', type=str, default='split', choices=['split', 'smp'],
+                        help="With --workers: split the root moves, or lazy smp helpers sharing one table.")
+    parser.add_argument('--tablebase', type=str, default=None,
+                        help="Tablebase file built by tablebase.py, perfect play on the standard grid.")
+    parser.add_argument('--eval_table', type=str, default=None,
+                        help="Heuristic table built by evaltable.py, v2 leaf scores read from a file on the standard grid.")
+    parser.add_argument('--book', type=str, default=None,
+                        help="Opening book built by book.py for the chosen grid.")
+    parser.add_argument('--symmetry', action='store_true',
+                        help="Mirrored positions share transposition table entries.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Keep the heuristic as running sums updated on every move (make/unmake search).")
+    parser.add_argument('--table_eval', action='store_true',
+                        help="Heuristic from precomputed line code tables instead of scanning the board.")
+    parser.add_argument('--batch_eval', action='store_true',
+                        help="Score all children of a depth 1 node in one numpy call (list search, needs numpy).")
     
     args = parser.parse_args()
 
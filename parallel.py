@@ -0,0 +1,196 @@
+# parallel.py
+"""
+Parallel searches, picked with agent.parallel.
+
+Root split ('split'):
+The moves at the root are handed out to a pool of worker processes, every worker searches one root move
+(agent.search_root_move) and the best score found so far is kept in a shared value. A worker starting a move
+reads it as its alpha (max) or beta (min), so later moves are cut as soon as they can't beat it. The best guess is
+searched alone first, so the others start with its score. The other edge is the caller's window, an aspiration
+search that fails high (low for min) is cut there, and on the first move the rest isn't searched at all.
+The agent goes to the workers once, when the pool starts (with a table of their own), a task is only the game
+state, the deadline, the move and the window.
+
+A move searched with a bound it doesn't beat only gives an upper (lower for min) bound on its score, so only
+moves that beat the bound they were searched with are candidates for the best move.
+
+Works with any agent that has player, state, deadline, root_moves(), search_root_move(move, depth, alpha, beta)
+(returns None when the search ran out of time) and can be pickled.
+
+Lazy smp ('smp'):
+The agent searches as usual while workers - 1 helper processes search the same root (agent.helper_search),
+half of them one ply deeper than the main search. They don't talk to each other except through one
+SharedTranspositionTable, the main search picks up their scores and best moves from it.
+"""
+
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from transposition import TranspositionTable, SharedTranspositionTable
+
+# fewer root moves than this are searched serially, not worth the trip to the pool
+MIN_PARALLEL_MOVES = 4
+# shallower searches are searched serially too
+MIN_PARALLEL_DEPTH = 3
+
+# set in every worker process
+_bound = None
+_stop = None
+# the agent of the pool, kept between searches
+_agent = None
+
+
+def _init_worker(bound, agent, table):
+    """
+    table: (size, replacement, saved file path, move kind, identity) of the agent's table, None without one
+    """
+    global _bound, _agent
+    _bound = bound
+    _agent = agent
+    if table is not None:
+        agent.tt = TranspositionTable(table[0], table[1])
+        if table[2] is not None:
+            agent.tt.load_file(*table[2:])
+
+
+def _search_move(state, deadline, move, depth, alpha, beta):
+    """
+    runs in a worker: searches one root move of state with the shared bound as alpha (max) or beta (min),
+    returns (score, bound used, nodes)
+    """
+    agent = _agent
+    agent.state = state
+    agent.deadline = deadline
+    is_max = agent.player == 0
+
+    bound = _bound.value
+    if is_max:
+        score = agent.search_root_move(move, depth, bound, beta)
+    else:
+        score = agent.search_root_move(move, depth, alpha, bound)
+    if score is not None:
+        with _bound.get_lock():
+            if (is_max and score > _bound.value) or (not is_max and score < _bound.value):
+                _bound.value = score
+    return score, bound, agent.nodes
+
+
+class RootSplitter:
+    def __init__(self, workers, agent):
+        """
+        agent: the agent whose roots the pool searches, as it is set up now (its state is sent with every search)
+        """
+        self.workers = workers
+        self.bound = multiprocessing.Value('d', 0.0)
+        # the pool gets a light copy, the table stays here and every worker keeps its own
+        worker = copy.copy(agent)
+        worker.splitter = None
+        worker.smp = None
+        worker.tt = None
+        table = None
+        if getattr(agent, 'tt', None) is not None:
+            table = (agent.tt.size, agent.tt.replacement, agent.tt.disk_path, agent.tt.disk_kind,
+                     agent.tt.disk_identity)
+        self.executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self.bound, worker, table))
+
+    def search(self, agent, moves, depth, alpha=float('-inf'), beta=float('inf')):
+        """
+        Searches the root moves (best guess first) of agent.state in the pool, with the window (alpha, beta).
+        returns (score, best_move, nodes), score is None when a worker ran out of time
+        """
+        is_max = agent.player == 0
+        self.bound.value = alpha if is_max else beta
+
+        def submit(move):
+            return self.executor.submit(_search_move, agent.state, agent.deadline, move, depth, alpha, beta)
+        # the best guess alone first, the others start with its score as their bound. If it is already outside the
+        # window (aspiration fail high, fail low for min) the others don't matter
+        futures = [submit(moves[0])]
+        score = futures[0].result()[0]
+        if score is None or (score < beta if is_max else score > alpha):
+            futures += [submit(move) for move in moves[1:]]
+
+        best_score = float('-inf') if is_max else float('inf')
+        best_move = None
+        fallback_score, fallback_move = best_score, None
+        nodes = 0
+        timed_out = False
+        for move, future in zip(moves, futures):
+            score, bound, worker_nodes = future.result()
+            nodes += worker_nodes
+            if score is None:
+                timed_out = True
+                continue
+            if is_max:
+                if score > fallback_score:
+                    fallback_score, fallback_move = score, move
+                # only a score above the bound it was searched with is exact
+                if score > bound and score > best_score:
+                    best_score, best_move = score, move
+            else:
+                if score < fallback_score:
+                    fallback_score, fallback_move = score, move
+                if score < bound and score < best_score:
+                    best_score, best_move = score, move
+
+        if timed_out:
+            return None, None, nodes
+        if best_move is None:
+            # nothing beat the window, the caller searches again with a wider one
+            return fallback_score, fallback_move, nodes
+        return best_score, best_move, nodes
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+# LAZY SMP ------------------------------------------------------------------------------------------------------------
+def _init_helper(stop):
+    global _stop
+    _stop = stop
+
+
+def _help(agent, offset, max_depth):
+    """
+    runs in a helper: searches until the main search raises the stop flag, returns the nodes searched
+    """
+    agent.stop = _stop
+    return agent.helper_search(offset, max_depth)
+
+
+class LazySMP:
+    def __init__(self, workers):
+        self.workers = workers
+        self.stop = multiprocessing.Value('b', 0)
+        self.executor = ProcessPoolExecutor(workers - 1, initializer=_init_helper, initargs=(self.stop,))
+
+    def search(self, agent, main, max_depth):
+        """
+        Runs main(), the usual search of agent, with the helpers searching up to max_depth in the background.
+        The agent's table is moved to shared memory the first time. Returns what main() returns
+        """
+        if not isinstance(agent.tt, SharedTranspositionTable):
+            if agent.tt is None:
+                agent.tt = SharedTranspositionTable()
+            else:
+                disk = agent.tt.disk_path, agent.tt.disk_kind, agent.tt.disk_identity
+                agent.tt = SharedTranspositionTable(agent.tt.size, agent.tt.replacement)
+                if disk[0] is not None:
+                    agent.tt.load_file(*disk)
+
+        helper = copy.copy(agent)
+        helper.splitter = None
+        helper.smp = None
+        self.stop.value = 0
+        # every other helper starts one ply deeper, so they are ahead of the main search rather than next to it
+        futures = [self.executor.submit(_help, helper, (i + 1) % 2, max_depth) for i in range(self.workers - 1)]
+        try:
+            result = main()
+        finally:
+            self.stop.value = 1
+            nodes = sum(future.result() for future in futures)
+        print(f"lazy smp: {self.workers - 1} helpers searched {nodes} nodes")
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown()
@@ -0,0 +1,122 @@
+# ponder.py
+"""
+Pondering: searching on the opponent's time in server games (--ponder).
+
+After our move the client sits in utils.receive_move and the processor has nothing to do. Ponderer.start searches
+the opponent's replies in a background thread meanwhile, each one as the position we will have to answer:
+'predicted' only the reply our own search expected (the table's best move after our move), 'all' every reply,
+all of them one ply deeper at a time with the predicted one first. The searches fill the agent's transposition
+table and the best answer to every reply is kept with its depth. When the real reply comes, finish stops the
+thread and returns the answer to it: if it was searched deep enough the client plays it straight away, otherwise
+the search starts with a warm table. Deep enough is the search depth, or in a timed game the depth our last timed
+search finished or the one the time for this move should reach, whichever is lower (deep_enough).
+
+The thread shares the agent's table and works on copies of everything else. The game loop doesn't touch the agent
+while it runs (it is waiting on the socket, which releases the GIL) and always calls finish before searching again.
+"""
+
+import copy
+import multiprocessing
+import threading
+
+from agents import MAX_DEPTH, SearchTimeout
+from timecontrol import expected_depth
+
+MODES = ('predicted', 'all')
+
+
+class Ponderer:
+    def __init__(self, agent, mode='all'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown ponder mode '{mode}'")
+        self.agent = agent
+        self.mode = mode
+        # raised to stop the thread, the searches check it with the clock (agent.stop)
+        self.stop = multiprocessing.Value('b', 0)
+        self.thread = None
+        # reply -> (depth, score, best answer) of the deepest search that finished
+        self.answers = {}
+        self.nodes = 0
+
+    def start(self):
+        """
+        after our move was played on agent.state: searches the opponent's replies until finish
+        """
+        agent = self.agent
+        if agent.rules.game_status(agent.state.board) is not None:
+            return
+        replies = agent.gen_actions(agent.state.board, agent.player == 1)
+        if not replies:
+            return
+        predicted = agent.predicted_reply()
+        replies = agent.move_first(list(replies), predicted)
+        if self.mode == 'predicted':
+            replies = replies[:1]
+
+        self.answers = {}
+        self.nodes = 0
+        self.stop.value = 0
+        self.thread = threading.Thread(target=self.run, args=(replies,), daemon=True)
+        self.thread.start()
+
+    def searcher(self, reply):
+        """
+        a copy of the agent in the position after reply, sharing only the transposition table
+        """
+        searcher = copy.copy(self.agent)
+        searcher.state = self.agent.state.copy()
+        searcher.state.apply(reply)
+        searcher.stop = self.stop
+        searcher.deadline = None
+        searcher.clock = None
+        searcher.workers = 1
+        searcher.splitter = None
+        searcher.smp = None
+        return searcher
+
+    def run(self, replies):
+        searchers = {reply: self.searcher(reply) for reply in replies}
+        try:
+            for depth in range(1, MAX_DEPTH + 1):
+                for reply in replies:
+                    searcher = searchers[reply]
+                    score, move = searcher.ponder_search(depth)
+                    self.nodes += searcher.nodes
+                    self.answers[reply] = (depth, score, move)
+                # every reply won or lost for sure, deeper won't change anything
+                if all(abs(answer[1]) == float('inf') for answer in self.answers.values()):
+                    return
+        except SearchTimeout:
+            pass
+
+    def finish(self, reply):
+        """
+        stops the thread, returns (depth, score, best answer) of reply, None if it wasn't searched
+        """
+        if self.thread is None:
+            return None
+        self.stop.value = 1
+        self.thread.join()
+        self.thread = None
+        answer = self.answers.get(reply)
+        depth = max((answer[0] for answer in self.answers.values()), default=0)
+        print(f"ponder: {len(self.answers)} replies searched to depth {depth} ({self.nodes} nodes), "
+              f"{'hit at depth ' + str(answer[0]) if answer is not None else 'miss'}")
+        return answer
+
+    def deep_enough(self, answer, depth, seconds):
+        """
+        answer: what finish returned. True if it can be played without searching: at least depth deep, or with
+        seconds to search (a time limit or the clock's target) as deep as the last timed search got or as seconds
+        should get. A won or lost answer is played whatever its depth, deeper won't change it
+        """
+        if answer is None or answer[2] is None:
+            return False
+        if abs(answer[1]) == float('inf'):
+            return True
+        if seconds is None:
+            return depth is not None and answer[0] >= depth
+        completed = self.agent.completed
+        if completed is None:
+            return False
+        return answer[0] >= min(completed[0], expected_depth(completed, seconds))
@@ -0,0 +1,287 @@
+# tablebase.py
+"""
+Endgame tablebase for the 5x4 game, every position solved by retrograde analysis.
+
+There are always 4 white and 4 black pieces, so a position is a 4 square subset for white and a 4 square subset
+of the 16 squares left for black: C(20,4) * C(16,4) = 8,817,900 positions. Both subsets are ranked with the
+combinatorial number system, index = white rank * 1820 + black rank.
+The side to move is not stored, it follows from the pieces: every move takes one piece from a light square to a
+dark one or back, so the number of pieces on dark squares ((x + y) odd) changes parity every ply. It starts even
+with white to move.
+
+Values are from the side to move: draw, or win / loss in d plies with best play (the winner takes the shortest
+way, the loser the longest). A side that has no move loses, like in the search. The 3 fold repetition rule is not
+part of the solve: a winning line never repeats a position of its own (the distance drops every ply), so from a
+fresh history wins and losses hold with it and everything else is a draw. In a game the earlier positions count
+too, a step onto one already seen twice is a draw whatever the table says (best_move's drawn).
+
+File: 16 byte header (b'C3TB', bits per entry, number of positions) then one entry per position packed into
+`bits` bits each, 0 = draw, otherwise 1 + (distance << 1 | won).
+
+Build it with (about 10 minutes in pure Python):
+python tablebase.py [path]
+"""
+
+import mmap
+import struct
+import sys
+import time
+from array import array
+from itertools import combinations
+from math import comb
+
+import bitboard
+
+PIECES = 4
+WHITE_POSITIONS = comb(bitboard.SIZE, PIECES)
+BLACK_POSITIONS = comb(bitboard.SIZE - PIECES, PIECES)
+POSITIONS = WHITE_POSITIONS * BLACK_POSITIONS
+
+DARK = sum(1 << sq for sq in range(bitboard.SIZE) if (sq % bitboard.WIDTH + sq // bitboard.WIDTH) % 2)
+
+HEADER = struct.Struct('<4sII4x')
+MAGIC = b'C3TB'
+DEFAULT_PATH = 'connect3.tb'
+
+
+# INDEXING ------------------------------------------------------------------------------------------------------------
+def _subsets(n):
+    """
+    every 4 element subset of range(n) as a tuple, in combinatorial number system order (index = rank)
+    """
+    subsets = list(combinations(range(n), PIECES))
+    subsets.sort(key=lambda s: sum(comb(sq, i + 1) for i, sq in enumerate(s)))
+    return subsets
+
+
+WHITE_SUBSETS = [sum(1 << sq for sq in s) for s in _subsets(bitboard.SIZE)]
+BLACK_SUBSETS = _subsets(bitboard.SIZE - PIECES)
+WHITE_RANK = {bits: rank for rank, bits in enumerate(WHITE_SUBSETS)}
+BLACK_RANK = {sum(1 << i for i in s): rank for rank, s in enumerate(BLACK_SUBSETS)}
+
+
+def white_to_move(white, black):
+    return ((white | black) & DARK).bit_count() % 2 == 0
+
+
+def index(white, black):
+    """
+    (white, black) bitboards -> position index. Black squares are numbered among the squares white leaves free
+    """
+    free = 0
+    bits = black
+    while bits:
+        low = bits & -bits
+        free |= 1 << ((low - 1) & ~white).bit_count()
+        bits ^= low
+    return WHITE_RANK[white] * BLACK_POSITIONS + BLACK_RANK[free]
+
+
+def _free_squares(white):
+    return [sq for sq in range(bitboard.SIZE) if not white >> sq & 1]
+
+
+def position(idx):
+    """
+    position index -> (white, black) bitboards
+    """
+    white = WHITE_SUBSETS[idx // BLACK_POSITIONS]
+    free = _free_squares(white)
+    black = 0
+    for i in BLACK_SUBSETS[idx % BLACK_POSITIONS]:
+        black |= 1 << free[i]
+    return white, black
+
+
+def _count_moves(own, other):
+    """
+    number of moves of bitboard.gen_moves without making the list
+    """
+    empty = ~(own | other) & bitboard.FULL
+    return ((own & (empty << bitboard.WIDTH)).bit_count()
+            + (own & (empty >> bitboard.WIDTH)).bit_count()
+            + (own & (empty >> 1) & ~bitboard.COL_4).bit_count()
+            + (own & (empty << 1) & ~bitboard.COL_0).bit_count())
+
+
+# SOLVER --------------------------------------------------------------------------------------------------------------
+def _unmoves(white, black):
+    """
+    positions one ply before (white, black) that are not over yet, as (white, black) pairs.
+    The side that just moved is the one not to move now
+    """
+    moved_white = not white_to_move(white, black)
+    own, other = (white, black) if moved_white else (black, white)
+    empty = ~(white | black) & bitboard.FULL
+    preds = []
+    bits = own
+    while bits:
+        low = bits & -bits
+        sq = low.bit_length() - 1
+        back = bitboard.ADJACENT[sq] & empty
+        while back:
+            prev = back & -back
+            prev_own = own ^ low ^ prev
+            pred = (prev_own, other) if moved_white else (other, prev_own)
+            if not bitboard.has_three(pred[0]) and not bitboard.has_three(pred[1]):
+                preds.append(pred)
+            back ^= prev
+        bits ^= low
+    return preds
+
+
+def solve():
+    """
+    Retrograde analysis: terminal positions first, then level by level, a position whose side to move can reach a
+    lost position is won one ply later, and a position whose moves all reach won positions is lost one ply after
+    the last of them. returns the values by index: 0 = draw, otherwise 1 + (distance << 1 | won)
+    """
+    values = array('H', bytes(2 * POSITIONS))
+    # moves left that don't reach a won position, the position is lost when it gets to 0
+    moves_left = bytearray(POSITIONS)
+    frontier = array('Q')
+
+    start = time.perf_counter()
+    idx = 0
+    for white in WHITE_SUBSETS:
+        free = _free_squares(white)
+        for subset in BLACK_SUBSETS:
+            black = 1 << free[subset[0]] | 1 << free[subset[1]] | 1 << free[subset[2]] | 1 << free[subset[3]]
+            white_moves = white_to_move(white, black)
+            status = bitboard.game_status(white, black)
+            if status is not None:
+                values[idx] = 1 + (status == (0 if white_moves else 1))
+                frontier.append(white | black << bitboard.SIZE)
+            else:
+                count = _count_moves(white, black) if white_moves else _count_moves(black, white)
+                if count == 0:
+                    values[idx] = 1
+                    frontier.append(white | black << bitboard.SIZE)
+                moves_left[idx] = count
+            idx += 1
+    print(f"{len(frontier)} positions over or stuck ({time.perf_counter() - start:.0f}s)")
+
+    distance = 0
+    while frontier:
+        next_frontier = array('Q')
+        for packed in frontier:
+            white, black = packed & bitboard.FULL, packed >> bitboard.SIZE
+            won = (values[index(white, black)] - 1) & 1
+            for pred_white, pred_black in _unmoves(white, black):
+                pred = index(pred_white, pred_black)
+                if values[pred]:
+                    continue
+                if not won:
+                    # the mover of pred can reach a lost position
+                    values[pred] = 1 + ((distance + 1) << 1 | 1)
+                    next_frontier.append(pred_white | pred_black << bitboard.SIZE)
+                else:
+                    moves_left[pred] -= 1
+                    if moves_left[pred] == 0:
+                        values[pred] = 1 + ((distance + 1) << 1)
+                        next_frontier.append(pred_white | pred_black << bitboard.SIZE)
+        distance += 1
+        print(f"distance {distance}: {len(next_frontier)} positions ({time.perf_counter() - start:.0f}s)")
+        frontier = next_frontier
+    return values
+
+
+# FILE ----------------------------------------------------------------------------------------------------------------
+def write(path, values):
+    """
+    packs the values into max(values).bit_length() bits each
+    """
+    bits = max(values).bit_length()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, bits, len(values)))
+        # 8 entries fill `bits` whole bytes
+        for i in range(0, len(values), 8):
+            group = 0
+            for j, value in enumerate(values[i:i + 8]):
+                group |= value << (j * bits)
+            f.write(group.to_bytes(bits, 'little'))
+        # a probe reads 3 bytes at a time
+        f.write(bytes(3))
+    return bits
+
+
+class Tablebase:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bits, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or count != POSITIONS:
+            raise ValueError(f"{path} is not a 5x4 tablebase")
+        self.mask = (1 << self.bits) - 1
+        self.hits = 0
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def value(self, white, black):
+        offset = index(white, black) * self.bits
+        start = HEADER.size + (offset >> 3)
+        return int.from_bytes(self.data[start:start + 3], 'little') >> (offset & 7) & self.mask
+
+    def probe(self, white, black):
+        """
+        (result, distance) for the side to move, result 1 = win, -1 = loss. None for a draw
+        """
+        value = self.value(white, black)
+        if value == 0:
+            return None
+        self.hits += 1
+        value -= 1
+        return (1 if value & 1 else -1), value >> 1
+
+    def best_move(self, white, black, drawn=None):
+        """
+        (move, result, distance) of the side to move, the fastest win or the slowest loss.
+        drawn(child_white, child_black): True for the moves that are draws whatever the table says (repetitions of
+        the game), a win doesn't take them and a loss with one of them is a draw.
+        For a draw (or a finished game) move and result are None
+        """
+        entry = self.probe(white, black)
+        if entry is None or bitboard.game_status(white, black) is not None:
+            return None, None, None
+        result = entry[0]
+        is_white = white_to_move(white, black)
+        moves = bitboard.gen_moves(white, black) if is_white else bitboard.gen_moves(black, white)
+        best_move, best_distance = None, None
+        for move in moves:
+            if is_white:
+                child_white, child_black = bitboard.make_move(white, move), black
+            else:
+                child_white, child_black = white, bitboard.make_move(black, move)
+            if drawn is not None and drawn(child_white, child_black):
+                if result < 0:
+                    return None, None, None
+                continue
+            child = self.probe(child_white, child_black)
+            # the opponent loses (we win) or wins (we lose): the fastest one or the slowest one
+            if child is None or child[0] != -result:
+                continue
+            if best_move is None or (child[1] < best_distance if result > 0 else child[1] > best_distance):
+                best_move, best_distance = move, child[1]
+        if best_move is None:
+            return None, None, None
+        return best_move, result, best_distance + 1
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    print(f"Solving {POSITIONS} positions...")
+    values = solve()
+    wins = sum(1 for v in values if v and (v - 1) & 1)
+    losses = sum(1 for v in values if v and not (v - 1) & 1)
+    print(f"wins {wins}, losses {losses}, draws {POSITIONS - wins - losses}")
+    bits = write(path, values)
+    print(f"Wrote {path} ({bits} bits per position)")
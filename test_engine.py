@@ -0,0 +1,206 @@
+# test_engine.py
+"""
+Checks of the search that don't need a server: python -m pytest test_engine.py
+
+- the list, bitboard and make/unmake searches give the same root score on a few fixed positions
+- the transposition table's bounds (save picks the flag from the window, probe only trusts deep enough entries)
+- a few tablebase entries against a short exhaustive search, skipped without connect3.tb next to this file
+"""
+
+import contextlib
+import io
+import os
+
+import pytest
+
+import bitboard
+import tablebase
+from agents import make_agent
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+INF = float('inf')
+
+
+# SEARCHES ------------------------------------------------------------------------------------------------------------
+# moves from the start, white (player 0) to move after all of them
+POSITIONS = [
+    [((0, 0), (1, 0)), ((0, 1), (1, 1)), ((1, 0), (2, 0)), ((1, 1), (2, 1))],
+    [((4, 3), (3, 3)), ((4, 2), (3, 2)), ((4, 1), (4, 2)), ((4, 0), (4, 1)), ((3, 3), (4, 3)), ((0, 1), (1, 1)),
+     ((0, 2), (1, 2)), ((3, 2), (3, 3))],
+    [((0, 0), (1, 0)), ((4, 2), (3, 2)), ((4, 1), (3, 1)), ((0, 1), (1, 1)), ((1, 0), (0, 0)), ((1, 1), (0, 1)),
+     ((0, 0), (1, 0)), ((4, 0), (4, 1)), ((1, 0), (1, 1)), ((3, 2), (2, 2))],
+    [((4, 1), (3, 1)), ((0, 1), (1, 1)), ((3, 1), (3, 2)), ((1, 1), (1, 2)), ((4, 3), (3, 3)), ((0, 3), (1, 3)),
+     ((3, 2), (3, 1)), ((4, 0), (4, 1))],
+]
+
+
+def root_score(model, moves, search, depth):
+    """
+    score of the root searched depth deep by the agent of model (player 0) with the list, bitboard ('bb') or
+    make/unmake ('mu') search, set up the way find_best_move sets them up
+    """
+    agent = make_agent(model, 0)
+    for move in moves:
+        agent.play_move(move)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if search == 'list':
+            history = agent.state.history.copy() if agent.repetition else None
+            agent.setup_symmetry()
+            return agent.minimax(agent.board, depth, True, *agent.list_args(agent.state.hash, history, -INF, INF))[0]
+        agent.root_depth = depth
+        if search == 'bb':
+            agent.use_bitboard = True
+            white, black, curr_hash, history = agent.setup_bb()
+            return agent.minimax_bb(white, black, depth, True, -INF, INF, curr_hash, history)[0]
+        agent.make_unmake = True
+        state, curr_hash, history = agent.setup_mu()
+        return agent.minimax_mu(state, depth, True, -INF, INF, curr_hash, history)[0]
+
+
+@pytest.mark.parametrize('moves', POSITIONS)
+@pytest.mark.parametrize('model, depth', [('mm', 3), ('ab', 4), ('abD', 4), ('ab2D', 4)])
+def test_searches_agree(model, depth, moves):
+    scores = [root_score(model, moves, search, depth) for search in ('list', 'bb', 'mu')]
+    assert scores[0] == scores[1] == scores[2]
+
+
+@pytest.mark.parametrize('moves', POSITIONS)
+@pytest.mark.parametrize('pruned, plain', [('ab', 'mm'), ('ab2', 'mm2')])
+def test_pruning_keeps_the_score(pruned, plain, moves):
+    # alpha beta (and the table of ab2) only skips what can't change the minimax score
+    assert root_score(pruned, moves, 'bb', 4) == root_score(plain, moves, 'list', 4)
+
+
+# TRANSPOSITION TABLE -------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('score, flag', [(-5, UPPER), (-2, UPPER), (0, EXACT), (2, LOWER), (5, LOWER)])
+def test_save_flags(score, flag):
+    tt = TranspositionTable(64)
+    tt.save(7, 3, score, -2, 2, 'm')
+    assert tt.lookup(7) == (3, score, flag, 'm')
+
+
+def test_probe_exact():
+    tt = TranspositionTable(64)
+    tt.save(7, 3, 1, -INF, INF, 'm')
+    assert tt.probe(7, 3, -INF, INF) == (1, 'm', -INF, INF)
+    assert tt.probe(7, 2, -10, 10) == (1, 'm', -10, 10)
+    # too shallow: no score, the move still orders the search
+    assert tt.probe(7, 4, -INF, INF) == (None, 'm', -INF, INF)
+
+
+def test_probe_bounds():
+    tt = TranspositionTable(64)
+    tt.store(7, 3, 4, LOWER, 'm')
+    # raises alpha, cuts when it reaches beta
+    assert tt.probe(7, 3, 0, 10) == (None, 'm', 4, 10)
+    assert tt.probe(7, 3, 0, 4) == (4, 'm', 4, 4)
+    tt.store(7, 3, 4, UPPER, 'm')
+    assert tt.probe(7, 3, 0, 10) == (None, 'm', 0, 4)
+    assert tt.probe(7, 3, 4, 10) == (4, 'm', 4, 4)
+    # a bound from a shallower search leaves the window alone
+    assert tt.probe(7, 5, 4, 10) == (None, 'm', 4, 10)
+
+
+def test_replacement():
+    tt = TranspositionTable(64)
+    tt.store(7, 5, 1, EXACT, 'a')
+    # another position on the same slot doesn't take a deeper entry's place, and doesn't match it
+    tt.store(7 + 64, 2, 2, EXACT, 'b')
+    assert tt.lookup(7) == (5, 1, EXACT, 'a')
+    assert tt.lookup(7 + 64) is None
+    # the same position always replaces its entry
+    tt.store(7, 1, 3, EXACT, 'c')
+    assert tt.lookup(7) == (1, 3, EXACT, 'c')
+
+    tt = TranspositionTable(64, replacement='always')
+    tt.store(7, 5, 1, EXACT, 'a')
+    tt.store(7 + 64, 2, 2, EXACT, 'b')
+    assert tt.lookup(7) is None
+    assert tt.lookup(7 + 64) == (2, 2, EXACT, 'b')
+
+
+# TABLEBASE -----------------------------------------------------------------------------------------------------------
+TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), tablebase.DEFAULT_PATH)
+
+# (white, black, result, distance) of the side to move, result 1 = win, -1 = loss, None for a draw
+TABLEBASE_POSITIONS = [
+    (266497, 66096, 1, 1),
+    (264322, 33297, -1, 2),
+    (9729, 33160, 1, 3),
+    (526496, 81992, -1, 4),
+    (164098, 589864, 1, 5),
+    (264705, 9264, None, None),
+]
+
+
+def children(white, black):
+    """
+    positions after every move of the side to move, and that side (0 white, 1 black)
+    """
+    if tablebase.white_to_move(white, black):
+        return [(bitboard.make_move(white, move), black) for move in bitboard.gen_moves(white, black)], 0
+    return [(white, bitboard.make_move(black, move)) for move in bitboard.gen_moves(black, white)], 1
+
+
+def wins_within(white, black, plies):
+    """
+    the side to move makes three in a row within plies, whatever the other side does
+    """
+    if plies < 1:
+        return False
+    positions, to_move = children(white, black)
+    for child_white, child_black in positions:
+        status = bitboard.game_status(child_white, child_black)
+        if status == to_move:
+            return True
+        if status is None and loses_within(child_white, child_black, plies - 1):
+            return True
+    return False
+
+
+def loses_within(white, black, plies):
+    """
+    the side to move has no move, or every move lets the other side win within plies
+    """
+    positions, _ = children(white, black)
+    if not positions:
+        return True
+    if plies < 2:
+        return False
+    return all(bitboard.game_status(child_white, child_black) is None
+               and wins_within(child_white, child_black, plies - 1) for child_white, child_black in positions)
+
+
+@pytest.fixture(scope='module')
+def table():
+    if not os.path.exists(TABLEBASE_PATH):
+        pytest.skip(f"no tablebase at {TABLEBASE_PATH} (python tablebase.py {tablebase.DEFAULT_PATH})")
+    table = tablebase.Tablebase(TABLEBASE_PATH)
+    yield table
+    table.close()
+
+
+@pytest.mark.parametrize('white, black, result, distance', TABLEBASE_POSITIONS)
+def test_tablebase(table, white, black, result, distance):
+    entry = table.probe(white, black)
+    if result is None:
+        assert entry is None
+        # no forced result for either side in the next few plies
+        assert not wins_within(white, black, 7)
+        assert not loses_within(white, black, 6)
+        return
+    assert entry == (result, distance)
+    # the distance is exact: the result can be forced in that many plies and not in fewer
+    if result > 0:
+        assert wins_within(white, black, distance) and not wins_within(white, black, distance - 1)
+    else:
+        assert loses_within(white, black, distance) and not loses_within(white, black, distance - 1)
+    # the table's move keeps the result, one ply closer
+    move, move_result, move_distance = table.best_move(white, black)
+    assert (move_result, move_distance) == (result, distance)
+    positions, _ = children(white, black)
+    to_move_white = tablebase.white_to_move(white, black)
+    child = (bitboard.make_move(white, move), black) if to_move_white else (white, bitboard.make_move(black, move))
+    assert child in positions
+    if bitboard.game_status(*child) is None:
+        assert table.probe(*child) == (-result, distance - 1)
@@ -0,0 +1,124 @@
+# timecontrol.py
+"""
+Clock of a server game (agent.clock): a total budget for the game plus an increment per move.
+
+start_move splits what's left of the clock over the moves we still expect to play and scales the share by how
+complicated the position looks (how many moves we have against the average of the game so far). That gives a
+target, and a hard limit the search can never pass (the deadline, a few targets and never more than a fraction of
+the clock).
+While deepening, the agent asks next_iteration after every finished iteration. A best move that keeps changing
+or a score that swings stretches the target, a best move that stays the same for a few iterations shrinks it, and
+the next iteration only starts if it can finish in time. A position with one move is played straight away.
+end_move takes the time the move used off the clock and adds the increment.
+expected_depth guesses from the last search how deep a search of some seconds gets, a pondered answer that deep is
+played without searching.
+"""
+
+import time
+
+# moves we expect to still play at the start of the game, counts down to MIN_MOVES_LEFT
+MOVES_TO_GO = 30
+MIN_MOVES_LEFT = 10
+# seconds kept for the network and the Python around the search
+RESERVE = 0.5
+# hard limit: this many targets, and at most this share of the clock
+MAX_STRETCH = 4
+MAX_SHARE = 0.25
+# never plan less than this (depth 1 has to finish)
+MIN_MOVE_TIME = 0.05
+# complexity factor range (mobility / average mobility of the game)
+MIN_COMPLEXITY, MAX_COMPLEXITY = 0.6, 1.6
+# stability: per change of the best move, score swings above SCORE_SWING, the same move for STABLE_ITERATIONS
+CHANGE_FACTOR = 1.4
+SCORE_SWING = 5
+SWING_FACTOR = 1.3
+STABLE_ITERATIONS = 3
+STABLE_FACTOR = 0.6
+# the next iteration takes about this many times the one before
+BRANCHING_TIME = 2.5
+
+
+def expected_depth(completed, seconds):
+    """
+    depth a search of seconds should finish, from (depth, seconds) of the last iteration an earlier search finished
+    (agent.completed), every ply taking BRANCHING_TIME times the one before
+    """
+    depth, elapsed = completed
+    elapsed = max(elapsed, 1e-4)
+    while depth > 1 and elapsed > seconds:
+        depth -= 1
+        elapsed /= BRANCHING_TIME
+    while elapsed * BRANCHING_TIME <= seconds:
+        depth += 1
+        elapsed *= BRANCHING_TIME
+    return depth
+
+
+class TimeManager:
+    def __init__(self, total, increment=0.0):
+        """
+        total: seconds on our clock for the whole game, increment: seconds added after every move
+        """
+        self.remaining = total
+        self.increment = increment
+        self.moves_played = 0
+        self.mobility_total = 0
+        self.move_start = None
+        self.target = None
+        self.hard_limit = None
+        # best move and score of the last iteration, how often the best move changed, iterations it didn't
+        self.best_move = None
+        self.last_score = None
+        self.changes = 0
+        self.stable = 0
+
+    def start_move(self, n_moves):
+        """
+        Starts our clock. n_moves: legal moves in the position.
+        Returns the hard limit in seconds, the time_limit handed to the agent
+        """
+        self.move_start = time.perf_counter()
+        self.mobility_total += n_moves
+        available = max(self.remaining - RESERVE, MIN_MOVE_TIME)
+        self.best_move, self.last_score = None, None
+        self.changes, self.stable = 0, 0
+        if n_moves <= 1:
+            self.target = self.hard_limit = MIN_MOVE_TIME
+            return self.hard_limit
+
+        moves_left = max(MOVES_TO_GO - self.moves_played, MIN_MOVES_LEFT)
+        average = self.mobility_total / (self.moves_played + 1)
+        complexity = min(max(n_moves / average, MIN_COMPLEXITY), MAX_COMPLEXITY)
+        self.target = (available / moves_left + self.increment) * complexity
+        self.hard_limit = max(min(self.target * MAX_STRETCH, available * MAX_SHARE), MIN_MOVE_TIME)
+        self.target = min(self.target, self.hard_limit)
+        print(f"clock: {self.remaining:.1f}s left, move {self.moves_played + 1}, target {self.target:.2f}s, "
+              f"limit {self.hard_limit:.2f}s")
+        return self.hard_limit
+
+    def next_iteration(self, depth, best_move, score, elapsed):
+        """
+        after the iteration of depth finished: True if the next one is worth starting
+        """
+        if depth > 1 and best_move != self.best_move:
+            self.changes += 1
+            self.stable = 0
+        else:
+            self.stable += 1
+        factor = CHANGE_FACTOR ** min(self.changes, 3)
+        if self.last_score is not None and abs(score - self.last_score) > SCORE_SWING:
+            factor *= SWING_FACTOR
+        if self.stable >= STABLE_ITERATIONS:
+            factor *= STABLE_FACTOR
+        self.best_move, self.last_score = best_move, score
+        target = min(self.target * factor, self.hard_limit)
+        return elapsed * BRANCHING_TIME < target
+
+    def end_move(self):
+        """
+        stops our clock, returns the seconds the move took
+        """
+        used = time.perf_counter() - self.move_start
+        self.remaining += self.increment - used
+        self.moves_played += 1
+        return used
@@ -0,0 +1,363 @@
+# transposition.py
+"""
+Transposition table keyed on the zobrist hashes from utils / bitboard.
+
+Every slot holds one entry (key, depth, score, flag, best_move). The slot is picked with key % size,
+the full key is kept in the entry so two positions sharing a slot are never mixed up.
+
+SharedTranspositionTable is the same table in shared memory, for the lazy smp workers of parallel.py.
+
+Either table can be saved at the end of a game (save_file) and memory mapped by the next one (load_file): lookups
+that miss in the table read the file, so a game starts with what the earlier ones searched. The zobrist tables are
+seeded (zobrist.py), so a key means the same position in every run. Scores also depend on the side and the
+evaluation, the file header names the agent that saved it and another one refuses it. They depend on the game's
+history too (a repetition draw scores 0), so only won and lost entries keep theirs in the file, the others are
+saved at depth 0: their best move still orders the next game's search but they never cut it off.
+"""
+
+import atexit
+import mmap
+import os
+import struct
+from multiprocessing import shared_memory
+
+# bound types
+EXACT = 0
+LOWER = 1  # score is at least this (search failed high)
+UPPER = 2  # score is at most this (search failed low)
+
+
+class TranspositionTable:
+    def __init__(self, size=1 << 20, replacement='depth'):
+        """
+        size: number of slots
+        replacement: 'depth' keeps the deeper search when two positions want the same slot,
+                     'always' keeps the newest one
+        """
+        if replacement not in ('depth', 'always'):
+            raise ValueError(f"Unknown replacement policy '{replacement}'")
+        self.size = size
+        self.replacement = replacement
+        self.entries = [None] * size
+        self.hits = 0
+        self.stores = 0
+        self.init_disk()
+
+    def lookup(self, key):
+        """
+        returns (depth, score, flag, best_move) or None
+        """
+        entry = self.entries[key % self.size]
+        if entry is None or entry[0] != key:
+            return self.disk_lookup(key)
+        self.hits += 1
+        return entry[1:]
+
+    def store(self, key, depth, score, flag, best_move):
+        index = key % self.size
+        old = self.entries[index]
+        if old is not None and self.replacement == 'depth' and old[0] != key and old[1] > depth:
+            return
+        self.entries[index] = (key, depth, score, flag, best_move)
+        self.stores += 1
+
+    def probe(self, key, depth, alpha, beta):
+        """
+        Looks the position up before searching it.
+        returns (score, best_move, alpha, beta), score is not None when the entry alone settles the node
+        """
+        entry = self.lookup(key)
+        if entry is None:
+            return None, None, alpha, beta
+        entry_depth, score, flag, best_move = entry
+        if entry_depth >= depth:
+            if flag == EXACT:
+                return score, best_move, alpha, beta
+            elif flag == LOWER:
+                alpha = max(alpha, score)
+            elif flag == UPPER:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score, best_move, alpha, beta
+        return None, best_move, alpha, beta
+
+    def save(self, key, depth, score, alpha, beta, best_move):
+        """
+        Stores a searched node, alpha and beta are the window the node was searched with
+        """
+        if score <= alpha:
+            flag = UPPER
+        elif score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.store(key, depth, score, flag, best_move)
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.hits = 0
+        self.stores = 0
+
+    def slots(self):
+        """
+        (key, data1, data2) of every entry, the slot format of the shared table and the saved file
+        """
+        for entry in self.entries:
+            if entry is not None:
+                key, depth, score, flag, best_move = entry
+                yield key, _WORD.unpack(_DOUBLE.pack(score))[0], _pack_data(depth, flag, best_move)
+
+    # SAVED TABLE -----------------------------------------------------------------------------------------------------
+    def init_disk(self):
+        self.disk = None
+        self.disk_file = None
+        self.disk_slots = 0
+        self.disk_path = None
+        self.disk_kind = None
+        self.disk_identity = None
+
+    def load_file(self, path, move_kind, identity=''):
+        """
+        Memory maps a table written by save_file() in an earlier game, lookups that miss in this table read it.
+        move_kind: MOVE_SQUARES for the bitboard searches, MOVE_COORDS for the list board ones. Entries with a move
+        of the other kind read as misses, a cutoff at the root needs a move this search can play.
+        identity: the agent the scores are for (agent.tt_identity), save_file writes it in the header. A file saved
+        by another agent (or that isn't a saved table) is left alone with a warning, the game starts without it and
+        save_file doesn't write over it.
+        Returns False when no file was loaded
+        """
+        self.close_file()
+        self.disk_path = None
+        self.disk_kind = move_kind
+        self.disk_identity = identity
+        if os.path.exists(path):
+            problem = _file_problem(path, identity)
+            if problem is not None:
+                print(f"Warning: {problem}, starting with an empty table")
+                return False
+            self.disk_file = open(path, 'rb')
+            self.disk = mmap.mmap(self.disk_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.disk_slots = DISK_HEADER.unpack_from(self.disk)[1]
+        self.disk_path = path
+        return self.disk is not None
+
+    def disk_lookup(self, key):
+        """
+        the entry of key in the loaded file (copied into the table), None without a file or if it isn't there
+        """
+        if self.disk is None:
+            return None
+        offset = DISK_HEADER.size + key % self.disk_slots * SLOT_BYTES
+        entry = _read_slot(self.disk, offset, key, self.disk_kind)
+        if entry is None:
+            return None
+        self.store(key, *entry)
+        self.hits += 1
+        return entry
+
+    def save_file(self, path):
+        """
+        Writes the loaded file's entries and then this table's over them (the deeper one keeps a contested slot
+        with 'depth' replacement) to path, in this table's size. Entries that aren't won or lost are written at
+        depth 0, their scores may come from repetition draws of this game. Written next to it and renamed, an
+        interrupted save leaves the old file. A file at path that isn't this agent's table is kept, returns None then,
+        otherwise the number of entries written
+        """
+        if os.path.exists(path):
+            problem = _file_problem(path, self.disk_identity or '')
+            if problem is not None:
+                print(f"Warning: {problem}, not saving over it")
+                return None
+        buf = bytearray(DISK_HEADER.size + self.size * SLOT_BYTES)
+        DISK_HEADER.pack_into(buf, 0, DISK_MAGIC, self.size, (self.disk_identity or '').encode())
+        sources = [self.slots()]
+        if self.disk is not None:
+            sources.insert(0, _raw_slots(self.disk, DISK_HEADER.size, self.disk_slots))
+        count = 0
+        for source in sources:
+            for key, data1, data2 in source:
+                if data1 not in _DECIDED:
+                    data2 &= ~0xffff
+                offset = DISK_HEADER.size + key % self.size * SLOT_BYTES
+                check, old_data1, old_data2 = _SLOT.unpack_from(buf, offset)
+                if old_data2 >> 16 & 0xff:
+                    if (self.replacement == 'depth' and check ^ old_data1 ^ old_data2 != key
+                            and old_data2 & 0xffff > data2 & 0xffff):
+                        continue
+                else:
+                    count += 1
+                _SLOT.pack_into(buf, offset, key ^ data1 ^ data2, data1, data2)
+
+        kind, identity = self.disk_kind, self.disk_identity
+        self.close_file()
+        with open(path + '.tmp', 'wb') as f:
+            f.write(buf)
+        os.replace(path + '.tmp', path)
+        if kind is not None:
+            self.load_file(path, kind, identity)
+        return count
+
+    def close_file(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk_file.close()
+        self.disk = None
+        self.disk_file = None
+
+
+# SHARED TABLE --------------------------------------------------------------------------------------------------------
+# a slot is three 64 bit words: key ^ data1 ^ data2, data1, data2
+SLOT_BYTES = 3 * 8
+_SLOT = struct.Struct('<3Q')
+_DOUBLE = struct.Struct('<d')
+_WORD = struct.Struct('<Q')
+# move kinds of a slot
+MOVE_SQUARES = 1
+MOVE_COORDS = 2
+# saved table: 112 byte header (b'C3T2', number of slots, identity of the agent) then the slots
+DISK_HEADER = struct.Struct('<4s4xQ96s')
+DISK_MAGIC = b'C3T2'
+# data1 of won and lost entries, the only scores kept in the file
+_DECIDED = {_WORD.unpack(_DOUBLE.pack(score))[0] for score in (float('inf'), float('-inf'))}
+
+
+def _pack_data(depth, flag, best_move):
+    """
+    depth, flag and best move in one word: depth (16 bits), flag + 1 (8, 0 = empty slot), move kind (8),
+    then the move, 8 bits per number. MOVE_SQUARES is a bitboard move (from_sq, to_sq), MOVE_COORDS a list board
+    move ((x, y), (new_x, new_y))
+    """
+    data = depth | (flag + 1) << 16
+    if best_move is not None:
+        if isinstance(best_move[0], tuple):
+            (x, y), (new_x, new_y) = best_move
+            data |= MOVE_COORDS << 24 | x << 32 | y << 40 | new_x << 48 | new_y << 56
+        else:
+            data |= MOVE_SQUARES << 24 | best_move[0] << 32 | best_move[1] << 40
+    return data
+
+
+def _unpack_move(data):
+    kind = data >> 24 & 0xff
+    if kind == MOVE_SQUARES:
+        return (data >> 32 & 0xff, data >> 40 & 0xff)
+    elif kind == MOVE_COORDS:
+        return ((data >> 32 & 0xff, data >> 40 & 0xff), (data >> 48 & 0xff, data >> 56 & 0xff))
+    return None
+
+
+def _read_slot(buf, offset, key, move_kind=None):
+    """
+    (depth, score, flag, best_move) of the slot at offset, None if it holds another key (or is empty or torn).
+    With move_kind, an entry with a move of the other kind is None too
+    """
+    check, data1, data2 = _SLOT.unpack_from(buf, offset)
+    if data2 >> 16 & 0xff == 0 or check ^ data1 ^ data2 != key:
+        return None
+    if move_kind is not None and data2 >> 24 & 0xff not in (0, move_kind):
+        return None
+    score = _DOUBLE.unpack(_WORD.pack(data1))[0]
+    return data2 & 0xffff, score, (data2 >> 16 & 0xff) - 1, _unpack_move(data2)
+
+
+def _file_problem(path, identity):
+    """
+    why the file at path isn't a table saved by the agent identity, None if it is
+    """
+    with open(path, 'rb') as f:
+        header = f.read(DISK_HEADER.size)
+    if len(header) < DISK_HEADER.size or header[:4] != DISK_MAGIC:
+        return f"{path} is not a saved transposition table"
+    saved_identity = DISK_HEADER.unpack(header)[2].rstrip(b'\0').decode()
+    if saved_identity != identity:
+        return f"{path} was saved by another agent ({saved_identity}), not this one ({identity})"
+    return None
+
+
+def _raw_slots(buf, start, size):
+    """
+    (key, data1, data2) of every used slot of size slots from start, skipping torn ones
+    """
+    for i in range(size):
+        check, data1, data2 = _SLOT.unpack_from(buf, start + i * SLOT_BYTES)
+        if data2 >> 16 & 0xff:
+            key = check ^ data1 ^ data2
+            if key % size == i:
+                yield key, data1, data2
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    TranspositionTable in a multiprocessing.shared_memory block that every worker process reads and writes.
+    There are no locks: the first word of a slot is the key xor-ed with the two data words, so a slot torn by two
+    processes writing at once no longer gives back its key and just reads as a miss.
+    Pickles as the name of the block, an agent sent to a worker process attaches to the same table.
+    """
+    def __init__(self, size=1 << 20, replacement='depth', name=None):
+        if replacement not in ('depth', 'always'):
+            raise ValueError(f"Unknown replacement policy '{replacement}'")
+        self.size = size
+        self.replacement = replacement
+        self.owner = name is None
+        if self.owner:
+            # new blocks come zero filled, flag 0 = empty slot
+            self.shm = shared_memory.SharedMemory(create=True, size=size * SLOT_BYTES)
+            atexit.register(self.close)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+        self.hits = 0
+        self.stores = 0
+        self.init_disk()
+
+    def __getstate__(self):
+        return (self.size, self.replacement, self.shm.name, self.disk_path, self.disk_kind, self.disk_identity)
+
+    def __setstate__(self, state):
+        size, replacement, name, disk_path, disk_kind, disk_identity = state
+        self.__init__(size, replacement, name)
+        if disk_path is not None:
+            self.load_file(disk_path, disk_kind, disk_identity)
+
+    def read(self, key):
+        """
+        returns (depth, score, flag, best_move) of the slot of key, None if the slot holds another key
+        """
+        return _read_slot(self.buf, key % self.size * SLOT_BYTES, key)
+
+    def lookup(self, key):
+        entry = self.read(key)
+        if entry is None:
+            return self.disk_lookup(key)
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, score, flag, best_move):
+        offset = key % self.size * SLOT_BYTES
+        if self.replacement == 'depth':
+            old_data2 = _WORD.unpack_from(self.buf, offset + 16)[0]
+            if old_data2 >> 16 & 0xff and old_data2 & 0xffff > depth and self.read(key) is None:
+                return
+        data1 = _WORD.unpack(_DOUBLE.pack(score))[0]
+        data2 = _pack_data(depth, flag, best_move)
+        _SLOT.pack_into(self.buf, offset, key ^ data1 ^ data2, data1, data2)
+        self.stores += 1
+
+    def clear(self):
+        self.buf[:] = bytes(self.size * SLOT_BYTES)
+        self.hits = 0
+        self.stores = 0
+
+    def slots(self):
+        return _raw_slots(self.buf, 0, self.size)
+
+    def close(self):
+        """
+        detaches from the block, the process that made it also frees it
+        """
+        if self.buf is None:
+            return
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -34,6 +34,16 @@ def receive_move(sock, buffer_size=1024):
         return None
 
 #  -------------------------------------------------------------------------------------------------------------------
+WIDTH = 5
+HEIGHT = 4
+# pos_score's values per square
+POS_VALUES = [
+    [1, 3, 7, 3, 1],
+    [3, 5, 9, 5, 3],
+    [3, 5, 9, 5, 3],
+    [1, 3, 7, 3, 1],
+]
+
 def in_board(x, y):
     return 0 <= y < 4 and 0 <= x < 5
 
@@ -56,26 +66,79 @@ def make_move(state, move, is_max):
     
     return new_state
 
-def format_move_to_string(move_tuple):
-    # Made by gemini
-    # This dictionary maps direction characters to their (dx, dy) coordinate changes
-    dirs = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}
+def apply_move(state, move, curr_hash=0, zobrist_table=None):
+    """
+    in place version of make_move, the piece is moved on state itself.
+    returns the updated zobrist hash (only if a table is given)
+    """
+    x, y = move[0]
+    new_x, new_y = move[1]
+    piece = state[y][x]
+    state[new_y][new_x] = piece
+    state[y][x] = None
+    if zobrist_table is not None:
+        curr_hash ^= zobrist_table[piece][y][x] ^ zobrist_table[piece][new_y][new_x]
+    return curr_hash
+
+def undo_move(state, move, curr_hash=0, zobrist_table=None):
+    """
+    reverts apply_move, the hash is xored back the same way
+    """
+    x, y = move[0]
+    new_x, new_y = move[1]
+    piece = state[new_y][new_x]
+    state[y][x] = piece
+    state[new_y][new_x] = None
+    if zobrist_table is not None:
+        curr_hash ^= zobrist_table[piece][y][x] ^ zobrist_table[piece][new_y][new_x]
+    return curr_hash
+
+def move_index(move):
+    """
+    ((x, y), (new_x, new_y)) -> from square * 4 + direction (N, S, E, W), used to index per move tables
+    """
+    x, y = move[0]
+    dx, dy = move[1][0] - x, move[1][1] - y
+    return (y * 5 + x) * 4 + (0 if dy == -1 else 1 if dy == 1 else 2 if dx == 1 else 3)
+
+# MOVE TABLES --------------------------------------------------------------------------------------------------------
+# A move code is the move_index of a move: from square * 4 + direction. The tables below are made once so move
+# generation and the "14E" strings don't have to build or look for anything.
+DIRECTIONS = 'NSEW'
+DIR_DELTAS = [(0, -1), (0, 1), (1, 0), (-1, 0)]
+
+def build_move_tables(width=5, height=4):
+    """
+    move_tuples[code]: ((x, y), (new_x, new_y)), move_strings[code]: "14E" (both None for moves off the board),
+    destinations[y][x]: (code, new_x, new_y) of every move from (x, y) that stays on the board, in N, S, E, W order
+    """
+    move_tuples = [None] * (width * height * 4)
+    move_strings = [None] * (width * height * 4)
+    destinations = [[[] for _ in range(width)] for _ in range(height)]
+    for y in range(height):
+        for x in range(width):
+            for direction, (dx, dy) in enumerate(DIR_DELTAS):
+                new_x, new_y = x + dx, y + dy
+                if 0 <= new_x < width and 0 <= new_y < height:
+                    code = (y * width + x) * 4 + direction
+                    move_tuples[code] = ((x, y), (new_x, new_y))
+                    move_strings[code] = f"{x + 1}{y + 1}{DIRECTIONS[direction]}"
+                    destinations[y][x].append((code, new_x, new_y))
+    return move_tuples, move_strings, destinations
+
+MOVE_TUPLES, MOVE_STRINGS, DESTINATIONS = build_move_tables()
+MOVE_CODES = {move_str: code for code, move_str in enumerate(MOVE_STRINGS) if move_str is not None}
 
-    if not move_tuple: 
+def format_move_to_string(move_tuple):
+    if not move_tuple:
         return None
-        
-    start_pos, end_pos = move_tuple
-    start_x, start_y = start_pos
-    end_x, end_y = end_pos
-    
-    # Calculate the change in x and y
-    dx, dy = end_x - start_x, end_y - start_y
-    
-    # Find the key (direction) where the value matches the (dx, dy) tuple
-    direction = [k for k, v in dirs.items() if v == (dx, dy)][0]
-    
-    # Return the 1-indexed coordinate string
-    return f"{start_x + 1}{start_y + 1}{direction}"
+    return MOVE_STRINGS[move_index(move_tuple)]
+
+def parse_move_string(move_str):
+    """
+    "14E" -> ((0, 3), (1, 3)), KeyError if it isn't a move on the board
+    """
+    return MOVE_TUPLES[MOVE_CODES[move_str[:2] + move_str[2:].upper()]]
 
 
 
@@ -120,6 +183,45 @@ def game_status(state):
     
     return None
 
+
+def build_lines_through(width, height):
+    """
+    lines_through[y][x]: every line of three through (x, y), as the pairs of its other two squares
+    """
+    lines_through = [[[] for _ in range(width)] for _ in range(height)]
+    for dx, dy in [(1, 0), (0, 1), (1, 1), (-1, 1)]:
+        for y in range(height):
+            for x in range(width):
+                line = [(x + i * dx, y + i * dy) for i in range(3)]
+                if all(0 <= lx < width and 0 <= ly < height for lx, ly in line):
+                    for lx, ly in line:
+                        lines_through[ly][lx].append(tuple(square for square in line if square != (lx, ly)))
+    return lines_through
+
+LINES_THROUGH = build_lines_through(5, 4)
+
+
+def check_win_at(state, x, y):
+    """
+    True if the piece on (x, y) is part of three in a row, only looks at the lines through (x, y)
+    """
+    player = state[y][x]
+    for (x1, y1), (x2, y2) in LINES_THROUGH[y][x]:
+        if state[y1][x1] == player and state[y2][x2] == player:
+            return True
+    return False
+
+
+def game_status_after(state, move):
+    """
+    game_status of a position reached by move from one that wasn't over: the moved piece is the only one that
+    can have made three in a row (taking a piece away never makes one)
+    """
+    new_x, new_y = move[1]
+    if check_win_at(state, new_x, new_y):
+        return state[new_y][new_x]
+    return None
+
 #---------------------------------------------------------------------------------------------------------------------------------------------------------
 
 
@@ -145,6 +247,89 @@ def calculate_new_hash(state, move, curr_hash, zobrist_table):
     return new_hash
 
 
+# REPETITION HISTORY
+# One dict shared by the whole search: a position is counted when the search enters it and uncounted on the way back,
+# so it always holds the game history plus the current path and nothing else.
+def enter_position(history, h):
+    """
+    counts one more visit of h, returns how many times it is on the game + search path now
+    """
+    count = history.get(h, 0) + 1
+    history[h] = count
+    return count
+
+def leave_position(history, h):
+    """
+    undoes enter_position
+    """
+    count = history[h] - 1
+    if count:
+        history[h] = count
+    else:
+        del history[h]
+
+
+# SYMMETRY
+# Mirroring the board left/right, top/bottom or both (a half turn) keeps every line a line and every square its value,
+# and keeps the side to move (that follows from the pieces), so all images of a position have the same score.
+# Caches keyed on canonical_hash hold one entry for all of them. Every symmetry is its own inverse.
+# A mirror with the colours swapped also maps the start onto itself, but it gives the move to the other side, a
+# position the hashes don't tell apart from the one with the same side to move, so it isn't used.
+SYMMETRIES = [(False, False), (True, False), (False, True), (True, True)]  # (mirror x, mirror y)
+
+def transform_square(x, y, sym, width=5, height=4):
+    mirror_x, mirror_y = SYMMETRIES[sym]
+    return (width - 1 - x if mirror_x else x, height - 1 - y if mirror_y else y)
+
+def transform_move(move, sym, width=5, height=4):
+    """
+    image of move under symmetry sym, the same call maps it back
+    """
+    if move is None or sym == 0:
+        return move
+    return (transform_square(*move[0], sym, width, height), transform_square(*move[1], sym, width, height))
+
+def transform_board(board, sym):
+    height, width = len(board), len(board[0])
+    new_board = [[None] * width for _ in range(height)]
+    for y in range(height):
+        for x in range(width):
+            new_x, new_y = transform_square(x, y, sym, width, height)
+            new_board[new_y][new_x] = board[y][x]
+    return new_board
+
+def symmetry_tables(zobrist_table):
+    """
+    one zobrist table per symmetry: hashing a board with table sym gives the hash of its image
+    """
+    height, width = len(zobrist_table[0]), len(zobrist_table[0][0])
+    tables = []
+    for sym in range(len(SYMMETRIES)):
+        table = [[[0] * width for _ in range(height)] for _ in range(2)]
+        for piece in range(2):
+            for y in range(height):
+                for x in range(width):
+                    new_x, new_y = transform_square(x, y, sym, width, height)
+                    table[piece][y][x] = zobrist_table[piece][new_y][new_x]
+        tables.append(table)
+    return tables
+
+def canonical_hash(board, sym_tables):
+    """
+    (key, sym): the smallest hash of the images of board and the symmetry that gives it.
+    Moves stored under key are mapped back to board with transform_move(move, sym)
+    """
+    pieces = [(piece, y, x) for y, row in enumerate(board) for x, piece in enumerate(row) if piece is not None]
+    best_key, best_sym = None, 0
+    for sym, table in enumerate(sym_tables):
+        h = 0
+        for piece, y, x in pieces:
+            h ^= table[piece][y][x]
+        if best_key is None or h < best_key:
+            best_key, best_sym = h, sym
+    return best_key, best_sym
+
+
 #---------------------------------------------------------------------------------------------------------------------------------------------------------
 # Heuristic V2 utils
 
@@ -331,18 +516,11 @@ def pos_score(state, player):
     """
     Positional value, if on center, higher prob of creating patterns, thus higher prob of controlling flow of game.
     """
-    value_map = [
-        [1, 3, 7, 3, 1],
-        [3, 5, 9, 5, 3], 
-        [3, 5, 9, 5, 3],
-        [1, 3, 7, 3, 1],
-    ]
-    
     score = 0
     for y in range(4):
         for x in range(5):
             if state[y][x] == player:
-                score += value_map[y][x]
+                score += POS_VALUES[y][x]
     return score
 
 
@@ -1,8 +1,25 @@
 # utils_large.py
 import copy
 
+import utils
+# in place moves and the repetition history don't depend on the board size (see utils)
+from utils import apply_move, undo_move, enter_position, leave_position
+from utils import SYMMETRIES, transform_board, symmetry_tables, canonical_hash
+
 # --- BOARD-SIZE DEPENDENT FUNCTIONS (MODIFIED) ---
 
+WIDTH = 7
+HEIGHT = 6
+# Positional value map for the 7x6 grid (pos_score).
+POS_VALUES = [
+    [1, 2, 3, 4, 3, 2, 1],
+    [2, 4, 6, 8, 6, 4, 2],
+    [3, 6, 9, 12, 9, 6, 3],
+    [3, 6, 9, 12, 9, 6, 3],
+    [2, 4, 6, 8, 6, 4, 2],
+    [1, 2, 3, 4, 3, 2, 1],
+]
+
 def in_board(x, y):
     """Checks if coordinates are within the 7x6 board."""
     return 0 <= y < 6 and 0 <= x < 7
@@ -31,6 +48,16 @@ def check_win(state, curr_player):
                 return True
     return False
 
+LINES_THROUGH = utils.build_lines_through(WIDTH, HEIGHT)
+
+def check_win_at(state, x, y):
+    """True if the piece on (x, y) is part of three in a row, only the lines through (x, y) on the 7x6 board."""
+    player = state[y][x]
+    for (x1, y1), (x2, y2) in LINES_THROUGH[y][x]:
+        if state[y1][x1] == player and state[y2][x2] == player:
+            return True
+    return False
+
 def calculate_initial_hash(board, zobrist_table):
     h = 0
     for y in range(6):
@@ -115,21 +142,23 @@ def count_runsoftwo(state, player):
 
 def pos_score(state, player):
     """Positional value map for the 7x6 grid."""
-    value_map = [
-        [1, 2, 3, 4, 3, 2, 1],
-        [2, 4, 6, 8, 6, 4, 2],
-        [3, 6, 9, 12, 9, 6, 3],
-        [3, 6, 9, 12, 9, 6, 3],
-        [2, 4, 6, 8, 6, 4, 2],
-        [1, 2, 3, 4, 3, 2, 1],
-    ]
     score = 0
     for y in range(6):
         for x in range(7):
             if state[y][x] == player:
-                score += value_map[y][x]
+                score += POS_VALUES[y][x]
     return score
 
+def move_index(move):
+    """((x, y), (new_x, new_y)) -> from square * 4 + direction (N, S, E, W) on the 7x6 board."""
+    x, y = move[0]
+    dx, dy = move[1][0] - x, move[1][1] - y
+    return (y * 7 + x) * 4 + (0 if dy == -1 else 1 if dy == 1 else 2 if dx == 1 else 3)
+
+# move codes (move_index) -> tuples and "14E" strings, destinations per square, see utils
+MOVE_TUPLES, MOVE_STRINGS, DESTINATIONS = utils.build_move_tables(WIDTH, HEIGHT)
+MOVE_CODES = {move_str: code for code, move_str in enumerate(MOVE_STRINGS) if move_str is not None}
+
 # --- BOARD-SIZE INDEPENDENT FUNCTIONS (COPIED) ---
 
 def make_move(state, move, is_max):
@@ -141,19 +170,25 @@ def make_move(state, move, is_max):
     return new_state
 
 def format_move_to_string(move_tuple):
-    dirs = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}
     if not move_tuple: return None
-    start_pos, end_pos = move_tuple
-    start_x, start_y = start_pos
-    dx, dy = end_pos[0] - start_x, end_pos[1] - start_y
-    direction = [k for k, v in dirs.items() if v == (dx, dy)][0]
-    return f"{start_x + 1}{start_y + 1}{direction}"
+    return MOVE_STRINGS[move_index(move_tuple)]
+
+def parse_move_string(move_str):
+    """"14E" -> ((0, 3), (1, 3)), KeyError if it isn't a move on the board."""
+    return MOVE_TUPLES[MOVE_CODES[move_str[:2] + move_str[2:].upper()]]
 
 def game_status(state):
     if check_win(state, 0): return 0
     if check_win(state, 1): return 1
     return None
 
+def game_status_after(state, move):
+    """game_status after move from a position that wasn't over, only the moved piece can have made three."""
+    new_x, new_y = move[1]
+    if check_win_at(state, new_x, new_y):
+        return state[new_y][new_x]
+    return None
+
 def calculate_new_hash(state, move, curr_hash, zobrist_table):
     x, y = move[0]
     new_x, new_y = move[1]
@@ -161,4 +196,16 @@ def calculate_new_hash(state, move, curr_hash, zobrist_table):
     new_hash = curr_hash
     new_hash ^= zobrist_table[player_token][y][x]
     new_hash ^= zobrist_table[player_token][new_y][new_x]
-    return new_hash
\ No newline at end of file
+    return new_hash
+
+# --- SYMMETRY (from utils, 7x6 defaults) ---
+# SYMMETRIES, transform_board, symmetry_tables and canonical_hash (imported above) take the size from their arguments
+
+def transform_square(x, y, sym, width=WIDTH, height=HEIGHT):
+    return utils.transform_square(x, y, sym, width, height)
+
+def transform_move(move, sym, width=WIDTH, height=HEIGHT):
+    """
+    image of move under symmetry sym, the same call maps it back
+    """
+    return utils.transform_move(move, sym, width, height)
@@ -0,0 +1,23 @@
+# zobrist.py
+"""
+The zobrist tables of every module, drawn from a fixed seed.
+
+A hash means the same position in every process and every run: the game and its agent agree, worker processes
+agree, and keys written to files (opening book, saved transposition table) still mean the same positions next time.
+"""
+
+import random
+
+SEED = 0xC3B00C
+_tables = {}
+
+
+def zobrist_table(width, height):
+    """
+    zobrist_table[player][y][x], the same numbers every time. Callers share the list, nobody changes it
+    """
+    if (width, height) not in _tables:
+        rng = random.Random(SEED)
+        _tables[width, height] = [[[rng.getrandbits(64) for _ in range(width)] for _ in range(height)]
+                                  for _ in range(2)]
+    return _tables[width, height]